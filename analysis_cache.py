@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+ANALYSIS_CACHE_DIR = "analysis_cache"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+
+def make_cache_key(image_bytes, model_name, instruction):
+    """Build a content-addressed key for an image analysis request"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(instruction.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Disk-backed cache of image analyses with size- and age-based eviction"""
+
+    def __init__(self, cache_dir=ANALYSIS_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached analysis for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if time.time() - entry.get("created", 0) > self.max_age_seconds:
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Bump mtime so size-based eviction drops least recently used entries first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry["text"]
+
+    def put(self, key, text, model_name=None):
+        """Store an analysis result and evict old entries if over budget"""
+        entry = {"text": text, "model": model_name, "created": time.time()}
+        payload = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += len(payload)
+            over_budget = self._total_bytes is None or self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        now = time.time()
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                # mtime tracks last use here; get() enforces age since creation
+                if now - stat.st_mtime > self.max_age_seconds:
+                    self._remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+        with self._lock:
+            self._total_bytes = total
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Return hit/miss counters and current cache footprint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self._total_bytes,
+            }
@@ -0,0 +1,270 @@
+"""Append-only segmented log for text artifacts, with an offset index and compressed closed segments."""
+import mmap
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from plan_store import PLANS_DIR
+from storage_utils import BackgroundWriter
+
+ARTIFACT_LOG_DIR = os.path.join(PLANS_DIR, "debug_plans")
+ARTIFACT_SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+# Oldest closed segments (and the artifacts in them) are dropped beyond this many
+ARTIFACT_MAX_SEGMENTS = 256
+ARTIFACT_COMPRESSION_LEVEL = 6
+# Memory maps of closed segments kept open for reads
+ARTIFACT_OPEN_SEGMENTS = 16
+
+INDEX_FILE = "index.tsv"
+INDEX_REWRITE_SLACK = 10_000
+SEGMENT_PATTERN = re.compile(r"^(\d{8})\.seg(\.z)?$")
+
+
+def _segment_name(number, compressed=False):
+    return f"{number:08d}.seg" + (".z" if compressed else "")
+
+
+class ArtifactLog:
+    """Artifacts appended to size-rotated segment files and fetched by ID in O(1)
+
+    The active segment holds raw UTF-8 records. Once it passes segment_max_bytes it is
+    closed and rewritten in the background with every record compressed on its own, so a
+    single record can still be read from a memory-mapped slice without touching the rest.
+    index.tsv maps each ID to (segment, offset, length); later lines override earlier ones.
+    """
+
+    def __init__(self, directory=ARTIFACT_LOG_DIR, segment_max_bytes=ARTIFACT_SEGMENT_MAX_BYTES,
+                 max_segments=ARTIFACT_MAX_SEGMENTS, compression_level=ARTIFACT_COMPRESSION_LEVEL,
+                 open_segments=ARTIFACT_OPEN_SEGMENTS, background=True):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.compression_level = compression_level
+        self.open_segments = open_segments
+        self._lock = threading.Lock()
+        self._index = {}
+        self._index_lines = 0
+        self._maps = OrderedDict()
+        self._compressor = BackgroundWriter(max_pending=64, name="segment-compressor") if background else None
+        os.makedirs(directory, exist_ok=True)
+
+        raw, compressed = self._load_index()
+        self._active_number = max(raw + compressed, default=0)
+        if self._active_number in compressed:
+            self._active_number += 1
+        self._segments = sorted(set(compressed) | set(raw) - {self._active_number})
+        self._active = open(self._path(_segment_name(self._active_number)), 'ab')
+        self._active_size = self._active.tell()
+        self._index_file = open(os.path.join(directory, INDEX_FILE), 'a', encoding='utf-8')
+        # Segments left raw by an interrupted rotation
+        for number in raw:
+            if number != self._active_number:
+                self._schedule_compression(number)
+
+    def _path(self, segment):
+        return os.path.join(self.directory, segment)
+
+    def _load_index(self):
+        """Replay the index once at startup; returns the raw and compressed segment numbers on disk"""
+        raw, compressed = [], []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                (compressed if match.group(2) else raw).append(int(match.group(1)))
+        present = {_segment_name(number) for number in raw} | {_segment_name(number, True) for number in compressed}
+
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    # A torn last line from a crash is simply skipped
+                    if len(fields) != 4 or not line.endswith("\n"):
+                        continue
+                    self._index_lines += 1
+                    artifact_id, segment, offset, length = fields
+                    if segment in present:
+                        self._index[artifact_id] = (segment, int(offset), int(length))
+        except FileNotFoundError:
+            pass
+        return raw, compressed
+
+    def append(self, artifact_id, text):
+        """Store text under artifact_id and return the ID"""
+        data = text.encode("utf-8")
+        closed = None
+        with self._lock:
+            segment = _segment_name(self._active_number)
+            offset = self._active_size
+            self._active.write(data)
+            self._active.flush()
+            self._active_size += len(data)
+            self._write_index([(artifact_id, segment, offset, len(data))])
+            self._index[artifact_id] = (segment, offset, len(data))
+            if self._active_size >= self.segment_max_bytes:
+                closed = self._rotate()
+        if closed is not None:
+            self._schedule_compression(closed)
+        return artifact_id
+
+    def _write_index(self, entries):
+        self._index_file.write("".join(f"{artifact_id}\t{segment}\t{offset}\t{length}\n"
+                                       for artifact_id, segment, offset, length in entries))
+        self._index_file.flush()
+        self._index_lines += len(entries)
+
+    def _rewrite_index(self):
+        """Replace the index with one line per live artifact; caller holds the lock"""
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{artifact_id}\t{segment}\t{offset}\t{length}\n"
+                         for artifact_id, (segment, offset, length) in self._index.items())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._index_file.close()
+        self._index_file = open(path, 'a', encoding='utf-8')
+        self._index_lines = len(self._index)
+
+    def _rotate(self):
+        """Close the active segment, start the next one and return the closed number; caller holds the lock"""
+        os.fsync(self._active.fileno())
+        self._active.close()
+        closed = self._active_number
+        self._active_number += 1
+        self._active = open(self._path(_segment_name(self._active_number)), 'ab')
+        self._active_size = 0
+        self._segments.append(closed)
+        self._prune()
+        # Superseded and pruned entries pile up in the append-only index; drop them now and then
+        if self._index_lines > 2 * len(self._index) + INDEX_REWRITE_SLACK:
+            self._rewrite_index()
+        return closed
+
+    def _schedule_compression(self, number):
+        if self._compressor is None:
+            self._compress_segment(number)
+        else:
+            self._compressor.submit(self._compress_segment, number)
+
+    def _compress_segment(self, number):
+        """Rewrite a closed raw segment with each record compressed individually"""
+        raw_segment = _segment_name(number)
+        compressed_segment = _segment_name(number, compressed=True)
+        with self._lock:
+            records = sorted((offset, length, artifact_id)
+                             for artifact_id, (segment, offset, length) in self._index.items()
+                             if segment == raw_segment)
+        raw_path = self._path(raw_segment)
+        try:
+            source = open(raw_path, 'rb')
+        except FileNotFoundError:
+            # Already pruned
+            return
+        entries = []
+        tmp_path = self._path(compressed_segment + ".tmp")
+        with source, open(tmp_path, 'wb') as target:
+            view = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) if records else None
+            try:
+                for offset, length, artifact_id in records:
+                    data = zlib.compress(view[offset:offset + length], self.compression_level)
+                    entries.append((artifact_id, compressed_segment, target.tell(), len(data)))
+                    target.write(data)
+            finally:
+                if view is not None:
+                    view.close()
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(tmp_path, self._path(compressed_segment))
+
+        with self._lock:
+            if number not in self._segments:
+                # Pruned while we were compressing
+                try:
+                    os.remove(self._path(compressed_segment))
+                except FileNotFoundError:
+                    pass
+                return
+            self._write_index(entries)
+            for artifact_id, segment, offset, length in entries:
+                if self._index.get(artifact_id, (None,))[0] == raw_segment:
+                    self._index[artifact_id] = (segment, offset, length)
+            self._maps.pop(raw_segment, None)
+        os.remove(raw_path)
+
+    def _prune(self):
+        """Drop the oldest closed segments beyond max_segments; caller holds the lock"""
+        while len(self._segments) > self.max_segments:
+            number = self._segments.pop(0)
+            dropped = {_segment_name(number), _segment_name(number, compressed=True)}
+            for artifact_id in [key for key, entry in self._index.items() if entry[0] in dropped]:
+                del self._index[artifact_id]
+            for segment in dropped:
+                self._maps.pop(segment, None)
+                try:
+                    os.remove(self._path(segment))
+                except FileNotFoundError:
+                    pass
+
+    def get(self, artifact_id):
+        """Return the stored text for artifact_id, or None if unknown or pruned"""
+        # A segment can be swapped for its compressed copy between lookup and read; retry once
+        for _ in range(2):
+            with self._lock:
+                entry = self._index.get(artifact_id)
+                if entry is None:
+                    return None
+                segment, offset, length = entry
+                active = segment == _segment_name(self._active_number)
+                if active:
+                    self._active.flush()
+                    view = None
+                else:
+                    view = self._segment_map(segment)
+            if not active and view is None:
+                continue
+            try:
+                if active:
+                    with open(self._path(segment), 'rb') as f:
+                        data = os.pread(f.fileno(), length, offset)
+                else:
+                    data = view[offset:offset + length]
+            except (FileNotFoundError, ValueError):
+                continue
+            if segment.endswith(".z"):
+                data = zlib.decompress(data)
+            return data.decode("utf-8")
+        return None
+
+    def _segment_map(self, segment):
+        """Return a cached read-only memory map of a closed segment; caller holds the lock"""
+        view = self._maps.get(segment)
+        if view is not None:
+            self._maps.move_to_end(segment)
+            return view
+        try:
+            with open(self._path(segment), 'rb') as f:
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        self._maps[segment] = view
+        # Evicted maps are closed by the garbage collector once no reader holds them
+        while len(self._maps) > self.open_segments:
+            self._maps.popitem(last=False)
+        return view
+
+    def flush(self):
+        """Wait for pending segment compression"""
+        if self._compressor is not None:
+            self._compressor.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "artifacts": len(self._index),
+                "segments": len(self._segments) + 1,
+                "active_segment_bytes": self._active_size,
+            }
@@ -0,0 +1,775 @@
+"""Offline micro-benchmarks for the prompt generator hot paths.
+
+Run with: python benchmarks.py [suite ...] [--output results.json] [--baseline baseline.json]
+
+Comparing against a baseline exits with status 1 when a metric regresses by more
+than the tolerance, so the run can gate CI without network access.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from tempfile import NamedTemporaryFile
+
+from analysis_cache import AnalysisCache
+from artifact_log import ArtifactLog
+from gemini_stub import StubGeminiClient
+from image_pipeline import preprocess_image, upload_image
+from incident_index import IncidentIndex
+from log_ingest import ingest_log
+from perceptual_hash import DHASH_SIZE, MultiIndexHash, dhash_file
+import prompt_core
+from plan_store import SQLitePlanStore, fingerprint_input, new_plan_id, write_json_atomic
+from prompt_service import PromptService
+from prompt_templates import DEVELOPMENT_TEMPLATE, clear_render_cache, render_cached
+from search_index import SearchIndex
+from storage_utils import BackgroundWriter
+
+MB = 1024 * 1024
+DEFAULT_TOLERANCE = 0.25
+
+# Metric name rules for baseline comparisons; anything else is informational
+HIGHER_IS_BETTER_SUFFIXES = ("_per_second",)
+LOWER_IS_BETTER_SUFFIXES = ("_ms", "ms_per_image", "final_bytes", "bytes_copied", "output_bytes",
+                            "prompt_tokens", "heavy_modules")
+UPLOAD_CHUNK_SIZE = MB
+
+
+def _consume_upload(path_or_stream, mime_type=None):
+    """Stand-in for genai.upload_file: read the payload in chunks like the SDK's media upload"""
+    if isinstance(path_or_stream, (str, os.PathLike)):
+        with open(path_or_stream, 'rb') as f:
+            return _consume_upload(f, mime_type)
+    total = 0
+    while True:
+        chunk = path_or_stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return total
+        total += len(chunk)
+
+
+def _legacy_upload(image_file):
+    """Previous NamedTemporaryFile round trip, returning bytes staged outside the upload buffer"""
+    payload = image_file.getvalue()
+    with NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
+        tmp_file.write(payload)
+        tmp_path = tmp_file.name
+    try:
+        _consume_upload(tmp_path)
+    finally:
+        os.unlink(tmp_path)
+    # getvalue() copy + write to disk + read back from disk
+    return len(payload) * 3
+
+
+def _streamed_upload(image_file):
+    """In-memory path used by analyze_error_image"""
+    upload_image(_consume_upload, image_file, mime_type="image/png")
+    return 0
+
+
+def _time_per_call(func, payload, repeat):
+    timings = []
+    for _ in range(repeat):
+        image_file = io.BytesIO(payload)
+        start = time.perf_counter()
+        copied = func(image_file)
+        timings.append(time.perf_counter() - start)
+    return min(timings), copied
+
+
+def bench_image_upload(sizes_mb=(1, 5, 20), repeat=5):
+    """Compare bytes copied and latency per image for the temp-file and streamed upload paths"""
+    results = []
+    for size_mb in sizes_mb:
+        payload = os.urandom(size_mb * MB)
+        for name, func in (("tempfile", _legacy_upload), ("streamed", _streamed_upload)):
+            seconds, copied = _time_per_call(func, payload, repeat)
+            results.append({
+                "suite": "image_upload",
+                "case": f"{name}_{size_mb}mb",
+                "bytes_copied": copied,
+                "ms_per_image": seconds * 1000,
+            })
+    return results
+
+
+def _synthetic_screenshot(width, height, fmt):
+    """Render a terminal-like screenshot with dense text, as users typically upload"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), (30, 30, 30))
+    draw = ImageDraw.Draw(image)
+    line = 'Traceback (most recent call last): File "app.py", line 42, in handler'
+    for y in range(0, height, 18):
+        draw.text((10, y), f"{y:06d} {line}", fill=(220, 220, 220))
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def bench_image_preprocess(resolutions=((1920, 1080), (3840, 2160), (5120, 2880)), repeat=3):
+    """Report before/after upload size and preprocessing latency for typical screenshots"""
+    results = []
+    for width, height in resolutions:
+        for fmt in ("PNG", "JPEG"):
+            payload = _synthetic_screenshot(width, height, fmt)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                prepared = preprocess_image(payload)
+                timings.append(time.perf_counter() - start)
+            results.append({
+                "suite": "image_preprocess",
+                "case": f"{fmt.lower()}_{width}x{height}",
+                "original_bytes": prepared.original_bytes,
+                "final_bytes": prepared.final_bytes,
+                "mime_type": prepared.mime_type,
+                "ms_per_image": min(timings) * 1000,
+            })
+
+    # Photos and gradients barely compress losslessly; this is the worst case for the encoder
+    from PIL import Image
+
+    side = 1500
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (side, side), random.Random(0).randbytes(side * side * 3)).save(buffer, format="PNG")
+    start = time.perf_counter()
+    prepared = preprocess_image(buffer.getvalue())
+    results.append({
+        "suite": "image_preprocess",
+        "case": f"noisy_png_{side}x{side}",
+        "original_bytes": prepared.original_bytes,
+        "final_bytes": prepared.final_bytes,
+        "mime_type": prepared.mime_type,
+        "ms_per_image": (time.perf_counter() - start) * 1000,
+    })
+    return results
+
+
+def _throughput(func, min_seconds=0.2):
+    """Call func repeatedly for at least min_seconds and return calls per second"""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+
+def bench_prompt_render(sizes=(100, 10 * 1024, 100 * 1024, MB)):
+    """Compare str.format, the pre-parsed template and the memoized render across input sizes"""
+    results = []
+    for size in sizes:
+        user_input = ("x" * 79 + "\n") * (size // 80) + "x" * (size % 80)
+        clear_render_cache()
+        render_cached(DEVELOPMENT_TEMPLATE, user_input=user_input)
+        development_prompt = DEVELOPMENT_TEMPLATE.source
+        cases = (
+            ("str_format", lambda: development_prompt.format(user_input=user_input)),
+            ("template", lambda: DEVELOPMENT_TEMPLATE.render(user_input=user_input)),
+            ("memoized", lambda: render_cached(DEVELOPMENT_TEMPLATE, user_input=user_input)),
+        )
+        for name, func in cases:
+            results.append({
+                "suite": "prompt_render",
+                "case": f"{name}_{size}b",
+                "renders_per_second": _throughput(func),
+            })
+    return results
+
+
+def bench_prompt_budget(sizes=(10 * 1024, 100 * 1024, MB, 8 * MB)):
+    """Prompt size and assembly latency for debug inputs of growing size"""
+    results = []
+    for size in sizes:
+        lines = [f"2024-05-01 10:00:{n % 60:02d} INFO worker-{n % 7} handled request {n} in {n % 97} ms"
+                 for n in range(size // 64)]
+        lines[len(lines) // 2] = "ERROR Traceback (most recent call last): ValueError: boom"
+        user_input = "\n".join(lines)
+        started = time.perf_counter()
+        result = prompt_core.generate_prompt(user_input, template=prompt_core.DEBUG_TEMPLATE, persist=False)
+        elapsed = time.perf_counter() - started
+        results.append({
+            "suite": "prompt_budget",
+            "case": f"debug_input_{size // 1024}kb",
+            "input_tokens": result.size_report["original_tokens"],
+            "prompt_tokens": result.size_report["total_tokens"],
+            "prompt_kb": len(result.prompt) / 1024,
+            "ms": elapsed * 1000,
+        })
+    return results
+
+
+def _sample_plan(index):
+    return {
+        "id": new_plan_id(),
+        "input_hash": fingerprint_input(f"Requerimiento de ejemplo {index}"),
+        "user_input": f"Requerimiento de ejemplo {index}",
+        "timestamp": time.strftime("%Y%m%d_%H%M%S"),
+        "plan": {section: [f"{section} step {n}..." for n in range(3)] for section in (
+            "analysis", "components", "implementation_steps", "technical_considerations", "testing")},
+        "status": "pending_validation",
+    }
+
+
+def _legacy_persist_plan(path, plan_data):
+    """Previous create_plan_file + validate_plan flow: write, read back, rewrite"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan_data, f, indent=2, ensure_ascii=False)
+    with open(path, 'r', encoding='utf-8') as f:
+        plan_data = json.load(f)
+    plan_data["status"] = "validated"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan_data, f, indent=2, ensure_ascii=False)
+
+
+def _atomic_persist_plan(path, plan_data):
+    plan_data["status"] = "validated"
+    write_json_atomic(path, plan_data)
+
+
+def bench_plan_persistence(count=500):
+    """Plans persisted per second: legacy double write, single atomic write, background queue"""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, persist in (("legacy", _legacy_persist_plan), ("atomic", _atomic_persist_plan)):
+            start = time.perf_counter()
+            for index in range(count):
+                persist(os.path.join(directory, f"{name}_{index}.json"), _sample_plan(index))
+            elapsed = time.perf_counter() - start
+            results.append({"suite": "plan_persistence", "case": name, "plans_per_second": count / elapsed})
+
+        store = SQLitePlanStore(os.path.join(directory, "plans.db"))
+        start = time.perf_counter()
+        for index in range(count):
+            plan_data = _sample_plan(index)
+            plan_data["status"] = "validated"
+            store.save(plan_data)
+        elapsed = time.perf_counter() - start
+        results.append({"suite": "plan_persistence", "case": "sqlite_wal", "plans_per_second": count / elapsed})
+
+        writer = BackgroundWriter(max_pending=count)
+        start = time.perf_counter()
+        for index in range(count):
+            writer.submit(_atomic_persist_plan, os.path.join(directory, f"bg_{index}.json"), _sample_plan(index))
+        enqueued = time.perf_counter() - start
+        writer.flush()
+        drained = time.perf_counter() - start
+        results.append({"suite": "plan_persistence", "case": "background_enqueue",
+                        "plans_per_second": count / enqueued})
+        results.append({"suite": "plan_persistence", "case": "background_drained",
+                        "plans_per_second": count / drained})
+    return results
+
+
+def _sample_debug_plan(index):
+    return (f"# Plan de Depuración\n## Error Reportado\nTimeoutError en /api/pagos (incidente {index})\n\n"
+            "## Análisis Inicial\n[Pendiente de aprobación]\n\n## Pasos de Diagnóstico\n[Pendiente de aprobación]\n")
+
+
+def bench_debug_plan_log(count=5000, reads=2000, segment_max_bytes=256 * 1024):
+    """Debug plan writes as loose Markdown files vs the artifact log, and random reads by ID"""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        for index in range(count):
+            with open(os.path.join(directory, f"debug_plan_{index}.md"), 'w', encoding='utf-8') as f:
+                f.write(_sample_debug_plan(index))
+        elapsed = time.perf_counter() - start
+        results.append({"suite": "debug_plan_log", "case": "markdown_files", "plans_per_second": count / elapsed})
+
+        log = ArtifactLog(os.path.join(directory, "log"), segment_max_bytes=segment_max_bytes)
+        ids = [new_plan_id() for _ in range(count)]
+        start = time.perf_counter()
+        for index, plan_id in enumerate(ids):
+            log.append(plan_id, _sample_debug_plan(index))
+        elapsed = time.perf_counter() - start
+        log.flush()
+        disk_bytes = sum(entry.stat().st_size for entry in os.scandir(log.directory))
+        results.append({"suite": "debug_plan_log", "case": "artifact_log", "plans_per_second": count / elapsed,
+                        "disk_bytes": disk_bytes, "segments": log.stats()["segments"]})
+
+        sample = random.Random(0).choices(ids, k=reads)
+        start = time.perf_counter()
+        for plan_id in sample:
+            log.get(plan_id)
+        elapsed = time.perf_counter() - start
+        results.append({"suite": "debug_plan_log", "case": "artifact_log_get",
+                        "reads_per_second": reads / elapsed, "get_ms": elapsed / reads * 1000})
+    return results
+
+
+def bench_search_index(count=50_000, queries=200, batch=1000, vocabulary_size=20_000):
+    """Full-text indexing throughput and ranked query latency over synthetic documents"""
+    generator = random.Random(0)
+    # Zipf-like word frequencies, as in real incident text
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = ["".join(generator.choices(letters, k=generator.randint(4, 10))) for _ in range(vocabulary_size)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary_size)]
+    documents = []
+    for index in range(count):
+        words = generator.choices(vocabulary, weights, k=40)
+        documents.append((f"doc_{index}", "plan", " ".join(words[:6]), f"Incidente {index}: " + " ".join(words),
+                          None))
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        index = SearchIndex(os.path.join(directory, "search.db"))
+        start = time.perf_counter()
+        for offset in range(0, count, batch):
+            index.add_many(documents[offset:offset + batch])
+        elapsed = time.perf_counter() - start
+        results.append({"suite": "search_index", "case": f"index_{count}", "docs_per_second": count / elapsed})
+
+        terms = [" ".join(generator.choices(vocabulary, weights, k=2)) for _ in range(queries)]
+        latencies = []
+        for text in terms:
+            start = time.perf_counter()
+            index.search(text)
+            latencies.append(time.perf_counter() - start)
+        results.append({"suite": "search_index", "case": f"query_{count}",
+                        "p50_ms": _percentile(latencies, 0.50) * 1000,
+                        "p99_ms": _percentile(latencies, 0.99) * 1000})
+    return results
+
+
+def _synthetic_incident(generator, family, words):
+    """Error text for an incident family, with the volatile parts that change between recurrences"""
+    family_words = random.Random(family).choices(words, k=30)
+    frames = "\n".join(
+        f'  File "/srv/{generator.randint(1, 99)}/app/{name}.py", line {generator.randint(1, 900)}, in {name}'
+        for name in family_words[:5]
+    )
+    return (f"{generator.randint(2020, 2025)}-05-01 10:{generator.randint(10, 59)}:00 ERROR "
+            f"{' '.join(family_words[5:])} id={generator.getrandbits(48):x}\n"
+            f"Traceback (most recent call last):\n{frames}\n"
+            f"ValueError: {' '.join(family_words[25:])} {generator.randint(0, 10 ** 6)}")
+
+
+def bench_incident_index(count=20_000, families=2_000, queries=200):
+    """Similar-incident LSH: indexing rate, lookup latency and recall of recurrences"""
+    generator = random.Random(0)
+    # Letters only: digits are masked by the normalizer
+    words = ["".join(generator.choices("abcdefghijklmnopqrstuvwxyz", k=7)) for _ in range(5_000)]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        index = IncidentIndex(os.path.join(directory, "incidents.db"))
+        start = time.perf_counter()
+        for number in range(count):
+            index.add(_synthetic_incident(generator, number % families, words), plan_id=f"plan_{number}")
+        elapsed = time.perf_counter() - start
+        results.append({"suite": "incident_index", "case": f"index_{count}", "incidents_per_second": count / elapsed})
+
+        latencies, found = [], 0
+        for number in range(queries):
+            text = _synthetic_incident(generator, number % families, words)
+            start = time.perf_counter()
+            matches = index.query(text)
+            latencies.append(time.perf_counter() - start)
+            found += bool(matches)
+        results.append({"suite": "incident_index", "case": f"query_{count}",
+                        "p50_ms": _percentile(latencies, 0.50) * 1000,
+                        "p99_ms": _percentile(latencies, 0.99) * 1000,
+                        "recall": found / queries})
+    return results
+
+
+def bench_near_duplicate(indexed=100_000, queries=200, max_distance=12):
+    """Perceptual hashing cost per screenshot and near-duplicate lookup latency"""
+    results = []
+    for width, height in ((1920, 1080), (3840, 2160)):
+        payload = _synthetic_screenshot(width, height, "PNG")
+        start = time.perf_counter()
+        for _ in range(5):
+            dhash_file(io.BytesIO(payload))
+        results.append({"suite": "near_duplicate", "case": f"dhash_{width}x{height}",
+                        "ms_per_image": (time.perf_counter() - start) / 5 * 1000})
+
+    # Clusters of recurring screenshots: each family differs in a few bits
+    generator = random.Random(0)
+    families = [generator.getrandbits(DHASH_SIZE ** 2) for _ in range(indexed // 20)]
+
+    def variant(value, flips):
+        for _ in range(flips):
+            value ^= 1 << generator.randrange(DHASH_SIZE ** 2)
+        return value
+
+    index = MultiIndexHash()
+    for number in range(indexed):
+        index.add(variant(families[number % len(families)], generator.randint(0, 8)), number)
+    latencies, found = [], 0
+    for _ in range(queries):
+        value = variant(generator.choice(families), 4)
+        start = time.perf_counter()
+        found += bool(index.search(value, max_distance))
+        latencies.append(time.perf_counter() - start)
+    results.append({"suite": "near_duplicate", "case": f"lookup_{indexed}",
+                    "p50_ms": _percentile(latencies, 0.50) * 1000,
+                    "p99_ms": _percentile(latencies, 0.99) * 1000,
+                    "recall": found / queries})
+    return results
+
+
+def _synthetic_log(size):
+    """Application log with timestamps, request IDs, a repeated warning and a traceback every ~1k lines"""
+    lines, total, n = [], 0, 0
+    while total < size:
+        if n % 997 == 500:
+            line = (f"2024-05-01 10:{n // 60 % 60:02d}:{n % 60:02d} ERROR Traceback (most recent call last):\n"
+                    f'  File "app/handlers.py", line {n % 300}, in process\n'
+                    f"ValueError: invalid payload for order {n}")
+        elif n % 7 == 0:
+            line = f"2024-05-01 10:{n // 60 % 60:02d}:{n % 60:02d} WARN retrying connection to db-{n % 3}"
+        else:
+            line = (f"2024-05-01 10:{n // 60 % 60:02d}:{n % 60:02d} INFO req={n:08x} "
+                    f"user={n * 7919 % 10007} path=/api/items/{n % 503} took={n % 97}ms")
+        lines.append(line)
+        total += len(line) + 1
+        n += 1
+    return "\n".join(lines)
+
+
+def bench_log_ingest(sizes=(100 * 1024, MB, 10 * MB), repeat=3):
+    """Streaming log condensation throughput and output size across input sizes"""
+    results = []
+    for size in sizes:
+        log_text = _synthetic_log(size)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            digest = ingest_log(log_text)
+            timings.append(time.perf_counter() - start)
+        seconds = min(timings)
+        results.append({
+            "suite": "log_ingest",
+            "case": f"log_{size // 1024}kb",
+            "output_bytes": digest.stats()["output_bytes"],
+            "mb_per_second": len(log_text) / MB / seconds,
+            "ingest_ms": seconds * 1000,
+        })
+    return results
+
+
+# Modules that should only load once an image is analysed or Gemini is called
+HEAVY_MODULES = ("google", "PIL")
+STARTUP_ENTRY_POINTS = ("prompt_core", "prompt_service")
+
+
+def _import_profile(module):
+    """Import module in a fresh interpreter; return (cumulative_us, {module: cumulative_us})"""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               check=True)
+    modules = {}
+    for line in completed.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)$", line)
+        if match and match.group(3) == "site":
+            # Everything before this was interpreter startup, not the module under test
+            modules.clear()
+        elif match:
+            modules[match.group(3)] = int(match.group(1))
+    return modules[module], modules
+
+
+def bench_startup(entry_points=STARTUP_ENTRY_POINTS, repeat=3):
+    """Cold import time of the entry points and whether heavy dependencies load eagerly"""
+    results = []
+    for module in entry_points:
+        profiles = [_import_profile(module) for _ in range(repeat)]
+        cumulative, modules = min(profiles, key=lambda profile: profile[0])
+        heavy = [name for name in modules if name.split(".")[0] in HEAVY_MODULES]
+        own = sorted((name for name in modules if name != module), key=modules.get, reverse=True)
+        results.append({
+            "suite": "startup",
+            "case": f"import_{module}",
+            "import_ms": cumulative / 1000,
+            "heavy_modules": len(heavy),
+            "slowest": ", ".join(f"{name} {modules[name] / 1000:.1f}ms" for name in own[:3]),
+        })
+
+    script = ("import time; start = time.perf_counter()\n"
+              "from streamlit.testing.v1 import AppTest\n"
+              "AppTest.from_file('streamlit_app.py', default_timeout=60).run()\n"
+              "print((time.perf_counter() - start) * 1000)")
+    with tempfile.TemporaryDirectory() as directory:
+        timings = []
+        for _ in range(repeat):
+            completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+                                       env=dict(os.environ, HOME=directory))
+            timings.append(float(completed.stdout.strip().splitlines()[-1]))
+    results.append({
+        "suite": "startup",
+        "case": "streamlit_first_render",
+        "first_render_ms": min(timings),
+    })
+    return results
+
+
+def _named_image(payload, name):
+    image_file = io.BytesIO(payload)
+    image_file.name = name
+    return image_file
+
+
+def _scratch_indexer(directory):
+    """Stand-in for prompt_core.index_document that writes to a throwaway search index"""
+    index = SearchIndex(os.path.join(directory, "search.db"))
+
+    def indexer(doc_id, kind, body, title=None, created_at=None):
+        index.add(doc_id, kind, title or "", body, created_at)
+    return indexer
+
+
+def bench_image_analysis(count=16, stub_latency=0.05,
+                         scenarios=((0.0, False), (0.25, False), (0.25, True), (1.0, True))):
+    """End-to-end image analysis (cache, preprocess, upload, stub inference) with injected failures
+
+    Each scenario is (failure_rate, resilient); resilient runs go through the retry and
+    circuit-breaker layer with short backoffs.
+    """
+    from PIL import Image
+    import prompt_core
+    from gemini_client import ResilientGeminiClient, retryable_errors
+    from resilience import CircuitBreaker, RetryPolicy
+
+    payloads = []
+    for shade in range(count):
+        buffer = io.BytesIO()
+        Image.new("RGB", (1280, 720), (shade * 13 % 256, 40, 90)).save(buffer, format="PNG")
+        payloads.append(buffer.getvalue())
+
+    results = []
+    for failure_rate, resilient in scenarios:
+        stub = StubGeminiClient(latency_seconds=stub_latency, failure_rate=failure_rate, seed=7)
+        client = stub
+        if resilient:
+            client = ResilientGeminiClient(
+                stub, RetryPolicy(retryable_errors(), base_delay=0.01, max_delay=0.05, seed=7),
+                CircuitBreaker(reset_seconds=60),
+            )
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AnalysisCache(directory)
+            indexer = _scratch_indexer(directory)
+            for phase in ("cold", "warm"):
+                image_files = [_named_image(payload, f"error_{index}.png") for index, payload in enumerate(payloads)]
+                start = time.perf_counter()
+                analyses = prompt_core.analyze_error_images(
+                    image_files, "stub-key", client_factory=lambda api_key: client, cache=cache,
+                    # The synthetic images are flat colours that share a dHash; measure real analyses
+                    indexer=indexer, near_duplicate_distance=None,
+                )
+                elapsed = time.perf_counter() - start
+                preprocess_times = [analysis["stats"]["preprocess_ms"] for analysis in analyses if analysis["stats"]]
+                results.append({
+                    "suite": "image_analysis",
+                    "case": f"{phase}_fail{int(failure_rate * 100)}{'_resilient' if resilient else ''}",
+                    "images_per_second": count / elapsed,
+                    "failed": sum(1 for analysis in analyses if analysis["error"]),
+                    "gemini_calls": stub.calls,
+                    "uploads": stub.uploads,
+                    "preprocess_ms": sum(preprocess_times) / len(preprocess_times) if preprocess_times else 0.0,
+                })
+    return results
+
+
+async def _asgi_request(app, method, path, body=b"", headers=()):
+    """Drive an ASGI app in-process and return (status, decoded JSON body)"""
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench_service_load(total_requests=400, concurrency=32, distinct_inputs=50, stub_latency=0.05):
+    """Offline load test of prompt_service against a stub Gemini backend, reporting p50/p99"""
+    from PIL import Image
+
+    # A quarter of the traffic is image analysis; a few screenshots repeat to exercise coalescing
+    images = []
+    for shade in range(total_requests // 8):
+        buffer = io.BytesIO()
+        Image.new("RGB", (320, 200), (shade % 256, shade // 256, 80)).save(buffer, format="PNG")
+        images.append(buffer.getvalue())
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        stub = StubGeminiClient(latency_seconds=stub_latency)
+        app = PromptService(client_factory=lambda api_key: stub, analysis_cache=AnalysisCache(directory),
+                            persist=False, max_pending=concurrency // 2, near_duplicate_distance=None)
+
+        async def client(worker, latencies, statuses):
+            for index in range(worker, total_requests, concurrency):
+                if index % 4 == 0:
+                    request = ("POST", "/v1/images/analyze", images[index % len(images)],
+                               [(b"x-gemini-api-key", b"stub-key")])
+                else:
+                    endpoint = "debug" if index % 2 else "development"
+                    body = json.dumps({"user_input": f"Requerimiento {index % distinct_inputs}"}).encode()
+                    request = ("POST", f"/v1/prompts/{endpoint}", body, [])
+                start = time.perf_counter()
+                status, _ = await _asgi_request(app, *request)
+                latencies.append(time.perf_counter() - start)
+                statuses.append(status)
+
+        async def drive():
+            latencies, statuses = [], []
+            start = time.perf_counter()
+            await asyncio.gather(*(client(worker, latencies, statuses) for worker in range(concurrency)))
+            return latencies, statuses, time.perf_counter() - start
+
+        latencies, statuses, elapsed = asyncio.run(drive())
+        results.append({
+            "suite": "service_load",
+            "case": f"c{concurrency}_n{total_requests}",
+            "p50_ms": _percentile(latencies, 0.50) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+            "requests_per_second": total_requests / elapsed,
+            "ok": statuses.count(200),
+            "rejected_429": statuses.count(429),
+            "coalesced": app.counters["coalesced"],
+            "gemini_calls": stub.calls,
+        })
+    return results
+
+
+SUITES = {
+    "service_load": bench_service_load,
+    "plan_persistence": bench_plan_persistence,
+    "debug_plan_log": bench_debug_plan_log,
+    "search_index": bench_search_index,
+    "incident_index": bench_incident_index,
+    "near_duplicate": bench_near_duplicate,
+    "prompt_render": bench_prompt_render,
+    "prompt_budget": bench_prompt_budget,
+    "image_preprocess": bench_image_preprocess,
+    "image_upload": bench_image_upload,
+    "image_analysis": bench_image_analysis,
+    "log_ingest": bench_log_ingest,
+    "startup": bench_startup,
+}
+
+
+def print_results(results):
+    for row in results:
+        metrics = ", ".join(
+            f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in row.items() if key not in ("suite", "case")
+        )
+        print(f"{row['suite']:>14}  {row['case']:<24} {metrics}")
+
+
+def save_results(path, results):
+    """Write results with enough environment details to judge whether runs are comparable"""
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def _direction(metric):
+    if metric.endswith(HIGHER_IS_BETTER_SUFFIXES):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER_SUFFIXES):
+        return -1
+    return 0
+
+
+def compare_results(baseline, results, tolerance=DEFAULT_TOLERANCE):
+    """Return rows for every directional metric present in both runs, flagging regressions"""
+    previous = {(row["suite"], row["case"]): row for row in baseline}
+    rows = []
+    for row in results:
+        old_row = previous.get((row["suite"], row["case"]))
+        if old_row is None:
+            continue
+        for metric, value in row.items():
+            direction = _direction(metric)
+            old_value = old_row.get(metric)
+            if not direction or not isinstance(value, (int, float)) or not isinstance(old_value, (int, float)):
+                continue
+            if old_value == 0:
+                change = 0.0 if value == 0 else float("inf")
+            else:
+                change = (value - old_value) / old_value
+            rows.append({
+                "suite": row["suite"],
+                "case": row["case"],
+                "metric": metric,
+                "baseline": old_value,
+                "current": value,
+                "change": change,
+                "regressed": change * direction < -tolerance,
+            })
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        flag = "REGRESSION" if row["regressed"] else ""
+        print(f"{row['suite']:>14}  {row['case']:<24} {row['metric']:<18} "
+              f"{row['baseline']:>12.3f} -> {row['current']:>12.3f} ({row['change']:+.1%}) {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("suites", nargs="*", metavar="suite",
+                        help=f"Suites to run (default: all): {', '.join(sorted(SUITES))}")
+    parser.add_argument("--output", help="Save results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against results previously saved with --output")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative change tolerated before a metric counts as a regression")
+    args = parser.parse_args()
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    results = []
+    for name in args.suites or sorted(SUITES):
+        suite_results = SUITES[name]()
+        print_results(suite_results)
+        results.extend(suite_results)
+
+    if args.output:
+        save_results(args.output, results)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        comparison = compare_results(baseline, results, args.tolerance)
+        print()
+        print_comparison(comparison)
+        regressions = [row for row in comparison if row["regressed"]]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
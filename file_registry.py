@@ -0,0 +1,118 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from storage_utils import BackgroundWriter
+
+# The Gemini file service keeps uploads for 48 hours
+FILE_TTL_SECONDS = 48 * 60 * 60
+# Don't hand out a handle that could expire while the request using it is still running
+FILE_REUSE_MARGIN_SECONDS = 60 * 60
+FILE_REGISTRY_MAX_ENTRIES = 512
+FILE_SWEEP_INTERVAL_SECONDS = 10 * 60
+# Images up to this size are sent inline with the request instead of uploaded
+INLINE_IMAGE_MAX_BYTES = 512 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def get_file_deleter():
+    """Return the background queue that deletes remote files off the request path"""
+    return BackgroundWriter(max_pending=4096, name="file-deleter")
+
+
+def _expires_at(handle):
+    """Epoch expiry of an uploaded file, assuming the service default when it isn't reported"""
+    expiration = getattr(handle, "expiration_time", None)
+    if isinstance(expiration, datetime) and expiration.year > 1970:
+        return expiration.timestamp()
+    return time.time() + FILE_TTL_SECONDS
+
+
+def _handle_name(handle):
+    return handle["name"] if isinstance(handle, dict) else handle.name
+
+
+class FileHandleRegistry:
+    """Remote file handles keyed by content hash, reused until shortly before they expire"""
+
+    def __init__(self, delete_file=None, max_entries=FILE_REGISTRY_MAX_ENTRIES,
+                 reuse_margin=FILE_REUSE_MARGIN_SECONDS):
+        self.delete_file = delete_file
+        self.max_entries = max_entries
+        self.reuse_margin = reuse_margin
+        self.reused = 0
+        self.uploaded = 0
+        self.deleted = 0
+        self._handles = OrderedDict()
+        self._next_sweep = time.time() + FILE_SWEEP_INTERVAL_SECONDS
+        self._lock = threading.Lock()
+
+    def get_or_upload(self, data, mime_type, upload):
+        """Return (handle, reused) for data, calling upload() only when no valid handle exists"""
+        digest = hashlib.sha256(data).hexdigest() + ":" + mime_type
+        now = time.time()
+        if now >= self._next_sweep:
+            self._next_sweep = now + FILE_SWEEP_INTERVAL_SECONDS
+            self.sweep()
+        with self._lock:
+            entry = self._handles.get(digest)
+            if entry is not None and entry[1] - self.reuse_margin > now:
+                self._handles.move_to_end(digest)
+                self.reused += 1
+                return entry[0], True
+
+        handle = upload()
+        stale = []
+        with self._lock:
+            self.uploaded += 1
+            previous = self._handles.get(digest)
+            if previous is not None and previous[1] - self.reuse_margin > now:
+                # Another thread uploaded the same content meanwhile; keep the first handle
+                stale.append(handle)
+                handle = previous[0]
+            else:
+                if previous is not None:
+                    stale.append(previous[0])
+                self._handles[digest] = (handle, _expires_at(handle))
+            self._handles.move_to_end(digest)
+            while len(self._handles) > self.max_entries:
+                stale.append(self._handles.popitem(last=False)[1][0])
+        self._delete_later(stale)
+        return handle, False
+
+    def sweep(self):
+        """Forget handles close to expiry and delete them remotely in the background"""
+        cutoff = time.time() + self.reuse_margin
+        with self._lock:
+            expired = [digest for digest, (_, expires_at) in self._handles.items() if expires_at <= cutoff]
+            stale = [self._handles.pop(digest)[0] for digest in expired]
+        self._delete_later(stale)
+        return len(stale)
+
+    def clear(self):
+        """Forget every handle and delete them remotely in the background"""
+        with self._lock:
+            stale = [handle for handle, _ in self._handles.values()]
+            self._handles.clear()
+        self._delete_later(stale)
+        return len(stale)
+
+    def _delete_later(self, handles):
+        if self.delete_file is None or not handles:
+            return
+        deleter = get_file_deleter()
+        for handle in handles:
+            deleter.submit(self._delete, _handle_name(handle))
+
+    def _delete(self, name):
+        self.delete_file(name)
+        with self._lock:
+            self.deleted += 1
+
+    def stats(self):
+        with self._lock:
+            return {"handles": len(self._handles), "reused": self.reused,
+                    "uploaded": self.uploaded, "deleted": self.deleted}
@@ -0,0 +1,165 @@
+import functools
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+
+# google.generativeai and its gRPC/protobuf stack take most of a second to import, so they are
+# loaded when the first client is built rather than when the app starts
+from file_registry import FileHandleRegistry
+from resilience import CircuitBreaker, RetryPolicy, call_with_retry, run_with_timeout
+from tracing import span
+
+GEMINI_MODEL_NAME = "gemini-exp-1121"
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 8192,
+}
+MAX_CACHED_CLIENTS = 32
+UPLOAD_DEADLINE_SECONDS = 60
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors():
+    """Transient failures worth retrying: rate limits, overload and server-side timeouts"""
+    from google.api_core import exceptions as google_exceptions
+
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.BadGateway,
+        google_exceptions.GatewayTimeout,
+        ConnectionError,
+    )
+
+
+class GeminiClient:
+    """Gemini model and file service bound to a single API key"""
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL_NAME, generation_config=None):
+        import google.generativeai as genai
+        from google.generativeai import client as genai_client
+
+        self.model_name = model_name
+        self.generation_config = dict(generation_config or DEFAULT_GENERATION_CONFIG)
+
+        # A private client manager keeps each key's channels out of the SDK's global state,
+        # so concurrent sessions with different keys never see each other's configuration.
+        # _ClientManager and GenerativeModel._client are private SDK internals, checked against
+        # google-generativeai 0.8.6 (the minimum in requirements.txt); recheck them on upgrades
+        self._manager = genai_client._ClientManager()
+        self._manager.configure(api_key=api_key)
+        self._file_client = self._manager.get_default_client("file")
+
+        self.model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=self.generation_config,
+        )
+        self.model._client = self._manager.get_default_client("generative")
+
+    def upload_file(self, path, mime_type=None, display_name=None):
+        """Upload a path or binary file object through this key's file service"""
+        from google.generativeai.types import file_types
+
+        # create_file takes a binary file object as path (IOBase); upload_image always passes one
+        response = self._file_client.create_file(
+            path=path, mime_type=mime_type, name=None, display_name=display_name, resumable=True
+        )
+        return file_types.File(response)
+
+    def delete_file(self, name):
+        """Delete an uploaded file before it expires on its own"""
+        self._file_client.delete_file(name=name)
+
+    def generate_content(self, contents, **kwargs):
+        """Run a single-turn generation with the pooled model"""
+        return self.model.generate_content(contents, **kwargs)
+
+
+class ResilientGeminiClient:
+    """Wraps a Gemini client (or a stub) with deadlines, jittered retries and a circuit breaker"""
+
+    def __init__(self, client, policy=None, breaker=None):
+        self.client = client
+        self.policy = policy or RetryPolicy(retryable_errors())
+        self.breaker = breaker or CircuitBreaker()
+        # Uploads belong to the key's project, so each client tracks its own handles
+        self.files = FileHandleRegistry(delete_file=getattr(client, "delete_file", None))
+
+    def upload_file(self, path, mime_type=None, display_name=None):
+        """Upload with a deadline, retrying transient failures"""
+        with span("gemini.upload") as call:
+            upload_attempts = []
+            def attempt(remaining):
+                source = path
+                if hasattr(path, "getbuffer"):
+                    # A timed-out attempt may still be reading the first stream; give retries their own
+                    source = io.BytesIO(path.getbuffer()) if upload_attempts else path
+                    source.seek(0)
+                upload_attempts.append(source)
+                return run_with_timeout(self.client.upload_file, min(remaining, UPLOAD_DEADLINE_SECONDS),
+                                        source, mime_type=mime_type, display_name=display_name)
+            result, attempts = call_with_retry(attempt, self.policy, self.breaker)
+            call.set(attempts=attempts, retries=attempts - 1)
+            return result
+
+    def generate_content(self, contents, stream=False, request_options=None, **kwargs):
+        """Generate with the request timeout as the overall deadline across retries"""
+        request_options = dict(request_options or {})
+        deadline = request_options.get("timeout", self.policy.deadline)
+        with span("gemini.generate", streamed=stream) as call:
+            def attempt(remaining):
+                # Each attempt may only use what is left of the overall deadline
+                options = dict(request_options, timeout=remaining)
+                return self.client.generate_content(contents, stream=stream, request_options=options, **kwargs)
+            response, attempts = call_with_retry(attempt, self.policy, self.breaker, deadline=deadline)
+            call.set(attempts=attempts, retries=attempts - 1)
+        return self._watch_stream(response) if stream else response
+
+    def _watch_stream(self, response):
+        """Count failures that happen after the first chunk against the breaker"""
+        try:
+            yield from response
+        except self.policy.retryable:
+            self.breaker.record_failure()
+            raise
+
+    def stats(self):
+        return self.breaker.stats()
+
+
+def _client_key(api_key, model_name, generation_config):
+    payload = json.dumps([api_key, model_name, generation_config], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_gemini_client(api_key, model_name=GEMINI_MODEL_NAME, generation_config=None):
+    """Return the pooled client for this API key and model config, building it once"""
+    generation_config = generation_config or DEFAULT_GENERATION_CONFIG
+    key = _client_key(api_key, model_name, generation_config)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+
+    # Build outside the lock so a slow handshake for one key doesn't block other sessions
+    client = ResilientGeminiClient(GeminiClient(api_key, model_name, generation_config))
+    evicted = []
+    with _clients_lock:
+        client = _clients.setdefault(key, client)
+        _clients.move_to_end(key)
+        while len(_clients) > MAX_CACHED_CLIENTS:
+            evicted.append(_clients.popitem(last=False)[1])
+    # Nothing would reuse or clean up an evicted client's uploads until they expire remotely
+    for stale_client in evicted:
+        stale_client.files.clear()
+    return client
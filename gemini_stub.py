@@ -0,0 +1,97 @@
+"""Deterministic stand-in for GeminiClient, for offline load tests and benchmarks."""
+import random
+import threading
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+# Errors the real API raises, so callers exercise the same handling paths
+FAILURES = {
+    "unavailable": lambda: google_exceptions.ServiceUnavailable("Stub: servicio no disponible"),
+    "rate_limit": lambda: google_exceptions.ResourceExhausted("Stub: cuota agotada"),
+    "deadline": lambda: google_exceptions.DeadlineExceeded("Stub: tiempo de espera agotado"),
+    "internal": lambda: google_exceptions.InternalServerError("Stub: error interno"),
+    "invalid": lambda: google_exceptions.InvalidArgument("Stub: petición inválida"),
+}
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGeminiClient:
+    """Mimics GeminiClient.upload_file/generate_content with injectable latency and failures
+
+    failure_rate is the share of generate_content calls that raise the `failure` error,
+    either before responding or, with fail_mid_stream, after the first streamed chunk.
+    """
+
+    def __init__(self, latency_seconds=0.05, jitter_seconds=0.0, chunks=4, seed=0,
+                 failure_rate=0.0, failure="unavailable", fail_mid_stream=False):
+        if failure not in FAILURES:
+            raise ValueError(f"Unknown stub failure: {failure}")
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.chunks = chunks
+        self.failure_rate = failure_rate
+        self.failure = failure
+        self.fail_mid_stream = fail_mid_stream
+        self.calls = 0
+        self.failures = 0
+        self.uploads = 0
+        self.deletes = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next_call(self):
+        """Return (delay, should_fail) for one call, drawn from the seeded generator"""
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(0, self.jitter_seconds) if self.jitter_seconds else 0.0
+            should_fail = self.failure_rate > 0 and self._random.random() < self.failure_rate
+            if should_fail:
+                self.failures += 1
+        return self.latency_seconds + jitter, should_fail
+
+    def upload_file(self, path, mime_type=None, display_name=None):
+        if hasattr(path, "read"):
+            size = len(path.read())
+        else:
+            with open(path, 'rb') as f:
+                size = len(f.read())
+        with self._lock:
+            self.uploads += 1
+        return {"name": f"files/stub-{size}", "mime_type": mime_type}
+
+    def delete_file(self, name):
+        with self._lock:
+            self.deletes += 1
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        text = f"Análisis simulado de {len(contents)} partes."
+        delay, should_fail = self._next_call()
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            # Like the real client, give up once the request timeout passes
+            time.sleep(timeout)
+            raise google_exceptions.DeadlineExceeded("Stub: tiempo de espera agotado")
+        if not stream:
+            time.sleep(delay)
+            if should_fail:
+                raise FAILURES[self.failure]()
+            return StubResponse(text)
+
+        if should_fail and not self.fail_mid_stream:
+            time.sleep(delay / self.chunks)
+            raise FAILURES[self.failure]()
+
+        def chunks():
+            words = text.split(" ")
+            step = max(1, len(words) // self.chunks)
+            for start in range(0, len(words), step):
+                time.sleep(delay / self.chunks)
+                if should_fail and start > 0:
+                    raise FAILURES[self.failure]()
+                yield StubResponse(" ".join(words[start:start + step]) + " ")
+        return chunks()
@@ -0,0 +1,141 @@
+import io
+import time
+
+MAX_IMAGE_SIDE = 2048
+JPEG_QUALITY = 90
+# Lossless WebP effort: quality/method above this barely shrink screenshots but multiply encode time
+WEBP_LOSSLESS_PARAMS = {"lossless": True, "quality": 50, "method": 2}
+# Images this small, already in an accepted format and without EXIF or ICC data are sent untouched
+PASSTHROUGH_MAX_BYTES = 512 * 1024
+EXIF_ORIENTATION_TAG = 0x0112
+
+_FORMAT_MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+def image_stream(image_file):
+    """Return a readable binary stream over the uploaded image without copying it"""
+    if isinstance(image_file, io.IOBase):
+        # Streamlit's UploadedFile is a BytesIO subclass: rewind and hand it over as-is
+        image_file.seek(0)
+        return image_file
+    if isinstance(image_file, memoryview):
+        # .obj is the whole underlying object, so it only stands in for a view that spans all of it
+        if isinstance(image_file.obj, bytes) and image_file.nbytes == len(image_file.obj):
+            image_file = image_file.obj
+    # BytesIO shares the buffer of an immutable bytes object until it is written to
+    return io.BytesIO(image_file)
+
+
+def image_buffer(image_file):
+    """Return a zero-copy memoryview of the uploaded image bytes"""
+    if hasattr(image_file, "getbuffer"):
+        return image_file.getbuffer()
+    return memoryview(image_file)
+
+
+def upload_image(upload_file, image_file, mime_type):
+    """Upload an image straight from memory; upload_file must accept a binary file object"""
+    return upload_file(image_stream(image_file), mime_type=mime_type)
+
+
+class PreparedImage:
+    """Re-encoded image ready for upload, with before/after size statistics"""
+
+    def __init__(self, data, mime_type, source_format, original_bytes,
+                 original_dimensions, dimensions, seconds=0.0):
+        self.data = data
+        self.mime_type = mime_type
+        self.source_format = source_format
+        self.original_bytes = original_bytes
+        self.original_dimensions = original_dimensions
+        self.dimensions = dimensions
+        self.seconds = seconds
+
+    @property
+    def final_bytes(self):
+        return len(self.data)
+
+    def stats(self):
+        """Return per-image size statistics for display and logging"""
+        return {
+            "source_format": self.source_format,
+            "mime_type": self.mime_type,
+            "original_bytes": self.original_bytes,
+            "final_bytes": self.final_bytes,
+            "ratio": self.final_bytes / self.original_bytes if self.original_bytes else 1.0,
+            "original_dimensions": self.original_dimensions,
+            "dimensions": self.dimensions,
+            "preprocess_ms": self.seconds * 1000,
+        }
+
+
+def _encode(image, fmt, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+def preprocess_image(image_file, max_side=MAX_IMAGE_SIDE):
+    """Detect the real format, cap the longest side, strip metadata and re-encode with one encoder
+
+    JPEG sources stay JPEG; everything else becomes lossless WebP, with PNG only when WebP is
+    unavailable or came out larger than the source.
+    """
+    # Pillow is only needed once someone uploads an image; keep it off the startup path
+    from PIL import Image, ImageOps, features
+
+    started = time.perf_counter()
+    original = image_buffer(image_file)
+    original_bytes = len(original)
+    with Image.open(image_stream(image_file)) as source:
+        source_format = source.format
+        original_dimensions = source.size
+        if (source_format in _FORMAT_MIME_TYPES and original_bytes <= PASSTHROUGH_MAX_BYTES
+                and max(source.size) <= max_side and not source.info.get("exif")
+                and not source.info.get("icc_profile")):
+            # Nothing to strip, rotate or shrink: decoding and re-encoding would only cost time.
+            # info is read from the header; getexif() would decode a whole PNG to look for eXIf
+            return PreparedImage(bytes(original), _FORMAT_MIME_TYPES[source_format], source_format,
+                                 original_bytes, original_dimensions, original_dimensions,
+                                 seconds=time.perf_counter() - started)
+        source.load()
+
+        has_alpha = source.mode in ("RGBA", "LA") or "transparency" in source.info
+        # Phone photos of a screen carry their rotation in EXIF, which is about to be dropped
+        if source.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1:
+            upright = ImageOps.exif_transpose(source)
+        else:
+            upright = source
+        # Copying pixels into a fresh image drops EXIF, ICC and text chunks
+        image = upright.convert("RGBA" if has_alpha else "RGB")
+        image.info = {}
+
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    if source_format == "JPEG" and not has_alpha:
+        # The source was already lossy, so a clean JPEG loses nothing readable
+        fmt, data = "JPEG", _encode(image, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    else:
+        # Lossless keeps small UI text crisp
+        fmt, data = None, None
+        if features.check("webp"):
+            fmt, data = "WEBP", _encode(image, "WEBP", **WEBP_LOSSLESS_PARAMS)
+        if data is None or len(data) > original_bytes:
+            png = _encode(image, "PNG")
+            if data is None or len(png) < len(data):
+                fmt, data = "PNG", png
+
+    return PreparedImage(
+        data=data,
+        mime_type=_FORMAT_MIME_TYPES[fmt],
+        source_format=source_format,
+        original_bytes=original_bytes,
+        original_dimensions=original_dimensions,
+        dimensions=image.size,
+        seconds=time.perf_counter() - started,
+    )
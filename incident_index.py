@@ -0,0 +1,238 @@
+"""Similar-incident retrieval: MinHash signatures of normalized error text in an LSH index (SQLite)."""
+import functools
+import hashlib
+import os
+import re
+import time
+from array import array
+
+from plan_store import PLANS_DIR
+from storage_utils import SQLiteConnections
+
+INCIDENTS_DB_PATH = os.path.join(PLANS_DIR, "incidents.db")
+MINHASH_PERMUTATIONS = 128
+# 32 bands of 4 rows: pairs above ~0.5 similarity almost always share a bucket, below ~0.2 rarely do
+LSH_BANDS = 32
+SHINGLE_WORDS = 3
+MINHASH_SEED = 20240501
+# Shingles hashed per numpy batch, bounding the temporary matrix to MINHASH_BATCH x MINHASH_PERMUTATIONS
+MINHASH_BATCH = 4096
+SIMILAR_INCIDENTS_TOP_K = 3
+SIMILAR_INCIDENTS_MIN_SIMILARITY = 0.5
+# Members read from each bucket, newest first, so hot buckets can't make lookups linear
+LSH_MAX_BUCKET_ROWS = 500
+# Distinct candidates compared per query, newest first
+LSH_MAX_CANDIDATES = 5000
+# Stored excerpt of the error text, for display
+INCIDENT_EXCERPT_CHARS = 2000
+
+# Volatile parts of error text that differ between recurrences of the same incident
+TIMESTAMP_PATTERN = re.compile(
+    r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?|\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"
+)
+UUID_PATTERN = re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+ADDRESS_PATTERN = re.compile(r"\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{12,}\b")
+# Keep the file name of a path, drop its directories and any :line:column suffix
+PATH_PATTERN = re.compile(r"(?:[\w.@~-]*[\\/])+([\w.@~-]+)(?::\d+)*")
+LINE_NUMBER_PATTERN = re.compile(r"\bline \d+\b|:\d+(?::\d+)?\b")
+NUMBER_PATTERN = re.compile(r"\d+")
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_error_text(text):
+    """Mask timestamps, IDs, addresses, paths, line numbers and numbers, then case-fold"""
+    text = TIMESTAMP_PATTERN.sub(" ", text)
+    text = UUID_PATTERN.sub(" ", text)
+    text = ADDRESS_PATTERN.sub(" ", text)
+    text = PATH_PATTERN.sub(r"\1", text)
+    text = LINE_NUMBER_PATTERN.sub(" ", text)
+    text = NUMBER_PATTERN.sub("#", text)
+    return " ".join(text.split()).casefold()
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Return the set of word n-gram hashes of normalized text"""
+    words = WORD_PATTERN.findall(normalize_error_text(text))
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = (" ".join(words[start:start + size]) for start in range(len(words) - size + 1))
+    return {_hash64(gram.encode("utf-8")) for gram in grams}
+
+
+@functools.lru_cache(maxsize=None)
+def _permutations(num_perm):
+    """Fixed multiply-shift hash parameters, identical across processes so stored signatures stay comparable"""
+    import numpy as np
+
+    rng = np.random.default_rng(MINHASH_SEED)
+    multipliers = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    increments = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    return multipliers, increments
+
+
+def minhash_signature(hashes, num_perm=MINHASH_PERMUTATIONS):
+    """MinHash of a set of 64-bit shingle hashes under num_perm multiply-shift hash functions"""
+    if not hashes:
+        return None
+    # numpy ships with streamlit; imported here so prompt_core stays cheap to import
+    import numpy as np
+
+    multipliers, increments = _permutations(num_perm)
+    values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    signature = array("I")
+    for start in range(0, len(values), MINHASH_BATCH):
+        batch = values[start:start + MINHASH_BATCH, None]
+        # uint64 arithmetic wraps, which is exactly the multiply-shift scheme
+        minima = ((batch * multipliers + increments) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+        if signature:
+            minima = np.minimum(minima, np.frombuffer(signature, dtype=np.uint32))
+        signature = array("I", minima.tobytes())
+    return signature
+
+
+def estimate_similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def band_buckets(signature, bands=LSH_BANDS):
+    """Hash each band of the signature to a bucket ID (the band number is part of the hash)"""
+    rows = len(signature) // bands
+    buckets = []
+    for band in range(bands):
+        data = band.to_bytes(2, "little") + signature[band * rows:(band + 1) * rows].tobytes()
+        # Signed, so it fits an SQLite INTEGER
+        buckets.append(_hash64(data) - (1 << 63))
+    return buckets
+
+
+class SimilarIncident:
+    """A past incident matching the current one"""
+
+    def __init__(self, incident_id, similarity, created_at, plan_id, error_text, image_analysis):
+        self.incident_id = incident_id
+        self.similarity = similarity
+        self.created_at = created_at
+        self.plan_id = plan_id
+        self.error_text = error_text
+        self.image_analysis = image_analysis
+
+
+class IncidentIndex:
+    """Past incidents indexed by MinHash/LSH for near-duplicate lookups in sub-linear time"""
+
+    def __init__(self, path=INCIDENTS_DB_PATH, num_perm=MINHASH_PERMUTATIONS, bands=LSH_BANDS,
+                 max_candidates=LSH_MAX_CANDIDATES, max_bucket_rows=LSH_MAX_BUCKET_ROWS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.max_candidates = max_candidates
+        self.max_bucket_rows = max_bucket_rows
+        self._connections = SQLiteConnections(path)
+
+        conn = self._connection()
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS incidents (
+                    id INTEGER PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    plan_id TEXT,
+                    error_text TEXT NOT NULL,
+                    image_analysis TEXT,
+                    signature BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    bucket INTEGER NOT NULL,
+                    incident_id INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_lsh_buckets ON lsh_buckets (bucket, incident_id);
+                CREATE INDEX IF NOT EXISTS idx_incidents_plan_id ON incidents (plan_id);
+            """)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def signature(self, error_text):
+        return minhash_signature(shingles(error_text), self.num_perm)
+
+    def add(self, error_text, plan_id=None, image_analysis=None, created_at=None):
+        """Index an incident; returns its ID, or None if the text has nothing to fingerprint
+
+        Adding the same plan_id twice keeps the first incident.
+        """
+        signature = self.signature(error_text)
+        if signature is None:
+            return None
+        conn = self._connection()
+        with conn:
+            if plan_id is not None:
+                row = conn.execute("SELECT id FROM incidents WHERE plan_id = ?", (plan_id,)).fetchone()
+                if row is not None:
+                    return row[0]
+            incident_id = conn.execute(
+                "INSERT INTO incidents (created_at, plan_id, error_text, image_analysis, signature) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (created_at if created_at is not None else time.time(), plan_id,
+                 error_text[:INCIDENT_EXCERPT_CHARS], image_analysis, signature.tobytes()),
+            ).lastrowid
+            conn.executemany("INSERT INTO lsh_buckets (bucket, incident_id) VALUES (?, ?)",
+                             [(bucket, incident_id) for bucket in band_buckets(signature, self.bands)])
+        return incident_id
+
+    def query(self, error_text, k=SIMILAR_INCIDENTS_TOP_K, min_similarity=SIMILAR_INCIDENTS_MIN_SIMILARITY):
+        """Return up to k past incidents at least min_similarity alike, most similar first"""
+        signature = self.signature(error_text)
+        if signature is None:
+            return []
+        conn = self._connection()
+        buckets = band_buckets(signature, self.bands)
+        # One limited range scan of idx_lsh_buckets per bucket; a plain IN (...) would read every member
+        bucket_scan = ("SELECT * FROM (SELECT incident_id FROM lsh_buckets WHERE bucket = ? "
+                       "ORDER BY incident_id DESC LIMIT ?)")
+        parameters = []
+        for bucket in buckets:
+            parameters.extend([bucket, self.max_bucket_rows])
+        rows = conn.execute(
+            f"SELECT DISTINCT incident_id FROM ({' UNION ALL '.join([bucket_scan] * len(buckets))}) "
+            "ORDER BY incident_id DESC LIMIT ?",
+            parameters + [self.max_candidates],
+        ).fetchall()
+        if not rows:
+            return []
+
+        import numpy as np
+
+        target = np.frombuffer(signature, dtype=np.uint32)
+        matches = []
+        candidate_ids = [row[0] for row in rows]
+        for start in range(0, len(candidate_ids), 500):
+            chunk = candidate_ids[start:start + 500]
+            stored = conn.execute(
+                f"SELECT id, signature FROM incidents WHERE id IN ({', '.join('?' * len(chunk))})", chunk,
+            ).fetchall()
+            signatures = np.frombuffer(b"".join(blob for _, blob in stored), dtype=np.uint32)
+            similarities = (signatures.reshape(len(stored), self.num_perm) == target).mean(axis=1)
+            matches.extend((float(similarity), incident_id)
+                           for (incident_id, _), similarity in zip(stored, similarities)
+                           if similarity >= min_similarity)
+        matches.sort(reverse=True)
+
+        incidents = []
+        for similarity, incident_id in matches[:k]:
+            created_at, plan_id, excerpt, image_analysis = conn.execute(
+                "SELECT created_at, plan_id, error_text, image_analysis FROM incidents WHERE id = ?",
+                (incident_id,),
+            ).fetchone()
+            incidents.append(SimilarIncident(incident_id, similarity, created_at, plan_id, excerpt, image_analysis))
+        return incidents
+
+    def stats(self):
+        count = self._connection().execute("SELECT count(*) FROM incidents").fetchone()[0]
+        return {"incidents": count}
@@ -0,0 +1,228 @@
+import io
+import re
+from collections import deque
+
+LOG_BUDGET_BYTES = 64 * 1024
+STACK_TRACE_BUDGET_BYTES = 32 * 1024
+HEAD_LINES = 40
+ERROR_CONTEXT_LINES = 3
+MAX_LINE_CHARS = 2000
+MAX_TRACKED_SIGNATURES = 50_000
+
+# Share of the budget given to the start of the log, the error regions and the end of the log
+HEAD_SHARE = 0.2
+ERROR_SHARE = 0.5
+
+# Matched against the lowercased line: much cheaper than an IGNORECASE alternation
+ERROR_PATTERN = re.compile(r"error|exception|traceback|fatal|panic|critical|caused by|fail")
+CONTINUATION_PATTERN = re.compile(r"^(\s+|File \"|at |Caused by|\.\.\. \d+ more)")
+VOLATILE_PATTERN = re.compile(r"0x[0-9a-fA-F]+|\d+")
+
+
+class LogDigest:
+    """Condensed view of a log: head, tail and error regions, with repeat counts"""
+
+    def __init__(self, text, input_bytes, input_lines, collapsed_lines, error_regions, omitted_lines):
+        self.text = text
+        self.input_bytes = input_bytes
+        self.input_lines = input_lines
+        self.collapsed_lines = collapsed_lines
+        self.error_regions = error_regions
+        self.omitted_lines = omitted_lines
+
+    def stats(self):
+        """Return ingestion statistics for display"""
+        return {
+            "input_bytes": self.input_bytes,
+            "input_lines": self.input_lines,
+            "output_bytes": len(self.text.encode("utf-8")),
+            "collapsed_lines": self.collapsed_lines,
+            "error_regions": self.error_regions,
+            "omitted_lines": self.omitted_lines,
+        }
+
+
+class _Entry:
+    """A run of consecutive lines that only differ in numbers, addresses or timestamps"""
+
+    __slots__ = ("line_no", "text", "count", "repeats", "signature")
+
+    def __init__(self, line_no, text, signature):
+        self.line_no = line_no
+        self.text = text
+        self.count = 1
+        # Later, non-adjacent occurrences folded into this one (repeated errors and frames)
+        self.repeats = 0
+        self.signature = signature
+
+    def render(self):
+        occurrences = self.count + self.repeats
+        return f"{self.text}  [×{occurrences}]" if occurrences > 1 else self.text
+
+    def size(self):
+        return len(self.text) + 8
+
+
+class _Tail:
+    """Most recent entries that fit in a byte budget"""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.entries = deque()
+        self.size = 0
+
+
+def _append_tail(tail, entry):
+    tail.entries.append(entry)
+    tail.size += entry.size()
+    while tail.size > tail.budget_bytes and tail.entries:
+        tail.size -= tail.entries.popleft().size()
+
+
+def iter_lines(source):
+    """Yield text lines from a string, a text stream or a binary upload without reading it whole"""
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if isinstance(source, (io.BufferedIOBase, io.RawIOBase)) or hasattr(source, "getbuffer"):
+        source.seek(0)
+        source = io.TextIOWrapper(source, encoding="utf-8", errors="replace", newline="")
+        try:
+            yield from source
+        finally:
+            # Don't let the wrapper close the caller's upload buffer
+            source.detach()
+        return
+    yield from source
+
+
+def _signature(text):
+    return hash(VOLATILE_PATTERN.sub("#", text))
+
+
+def _collapsed(lines):
+    """Group consecutive lines that match once volatile tokens are masked"""
+    current = None
+    for line_no, line in enumerate(lines, start=1):
+        text = line.rstrip("\r\n")
+        if len(text) > MAX_LINE_CHARS:
+            text = text[:MAX_LINE_CHARS] + "…"
+        signature = _signature(text)
+        if current is not None and current.signature == signature:
+            current.count += 1
+            continue
+        if current is not None:
+            yield current
+        current = _Entry(line_no, text, signature)
+    if current is not None:
+        yield current
+
+
+def ingest_log(source, budget_bytes=LOG_BUDGET_BYTES):
+    """Stream a log and keep its head, tail and every error region within budget_bytes"""
+    head_budget = int(budget_bytes * HEAD_SHARE)
+    error_budget = int(budget_bytes * ERROR_SHARE)
+    tail_budget = budget_bytes - head_budget - error_budget
+
+    head, head_bytes = [], 0
+    tail = _Tail(tail_budget)
+    context = deque(maxlen=ERROR_CONTEXT_LINES)
+    kept, kept_bytes = {}, 0
+    region_entries = {}
+    input_bytes = input_lines = collapsed = regions = 0
+    trailing_context = 0
+    in_region = False
+
+    # Logs that already fit the budget are passed through untouched
+    raw_lines, raw_bytes = [], 0
+
+    def remember_raw(lines):
+        nonlocal raw_lines, raw_bytes
+        for line in lines:
+            if raw_lines is not None:
+                raw_bytes += len(line)
+                if raw_bytes <= budget_bytes:
+                    raw_lines.append(line)
+                else:
+                    raw_lines = None
+            yield line
+
+    for entry in _collapsed(remember_raw(iter_lines(source))):
+        input_lines += entry.count
+        input_bytes += (len(entry.text) + 1) * entry.count
+        collapsed += entry.count - 1
+
+        if len(head) < HEAD_LINES and head_bytes + entry.size() <= head_budget:
+            head.append(entry)
+            head_bytes += entry.size()
+            continue
+
+        is_error = ERROR_PATTERN.search(entry.text.lower()) is not None
+        is_continuation = in_region and CONTINUATION_PATTERN.match(entry.text) is not None
+        if is_error or is_continuation:
+            in_region = True
+            # Errors and frames already kept elsewhere only bump the first occurrence's count
+            first = region_entries.get(entry.signature)
+            if first is not None:
+                # Counted once, in the first occurrence; keeping it in the tail too would count it twice
+                first.repeats += entry.count
+                collapsed += entry.count
+                continue
+            if len(region_entries) < MAX_TRACKED_SIGNATURES:
+                region_entries[entry.signature] = entry
+            if is_error and not is_continuation:
+                regions += 1
+            # Keep a few lines of context on both sides of each new error region
+            for previous in context:
+                if previous.line_no not in kept and kept_bytes + previous.size() <= error_budget:
+                    kept[previous.line_no] = previous
+                    kept_bytes += previous.size()
+            context.clear()
+            trailing_context = ERROR_CONTEXT_LINES
+            if kept_bytes + entry.size() <= error_budget:
+                kept[entry.line_no] = entry
+                kept_bytes += entry.size()
+            continue
+
+        in_region = False
+        if trailing_context:
+            trailing_context -= 1
+            if kept_bytes + entry.size() <= error_budget:
+                kept[entry.line_no] = entry
+                kept_bytes += entry.size()
+            continue
+
+        context.append(entry)
+        _append_tail(tail, entry)
+
+    if raw_lines is not None:
+        return LogDigest(
+            text="".join(raw_lines).rstrip("\r\n"),
+            input_bytes=input_bytes,
+            input_lines=input_lines,
+            collapsed_lines=0,
+            error_regions=regions,
+            omitted_lines=0,
+        )
+
+    for entry in tail.entries:
+        kept.setdefault(entry.line_no, entry)
+
+    output, omitted, last_line = [], 0, 0
+    for entry in head + sorted(kept.values(), key=lambda kept_entry: kept_entry.line_no):
+        if entry.line_no > last_line + 1 and last_line:
+            gap = entry.line_no - last_line - 1
+            omitted += gap
+            output.append(f"[... {gap} líneas omitidas ...]")
+        output.append(entry.render())
+        last_line = entry.line_no + entry.count - 1
+
+    return LogDigest(
+        text="\n".join(output),
+        input_bytes=input_bytes,
+        input_lines=input_lines,
+        collapsed_lines=collapsed,
+        error_regions=regions,
+        omitted_lines=omitted,
+    )
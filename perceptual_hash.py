@@ -0,0 +1,204 @@
+"""Perceptual hashes of screenshots and a multi-index hash for near-duplicate lookups."""
+import itertools
+import os
+import threading
+import time
+
+from analysis_cache import ANALYSIS_CACHE_DIR
+from storage_utils import SQLiteConnections
+
+PHASH_DB_PATH = os.path.join(ANALYSIS_CACHE_DIR, "phash.db")
+# 16x16 gradients: 256 bits keep enough detail to tell apart different dialogs on the same background
+DHASH_SIZE = 16
+# Default match threshold, in differing bits out of DHASH_SIZE ** 2
+PHASH_MAX_DISTANCE = 12
+# Decoding stops at roughly this size for formats that support draft mode (JPEG)
+DHASH_DRAFT_SIDE = 256
+# 16 tables of 16 bits: thresholds below 16 need one exact probe per table
+MIH_CHUNKS = 16
+
+
+def dhash(image, hash_size=DHASH_SIZE):
+    """Difference hash of a PIL image: one bit per horizontally adjacent pixel pair"""
+    from PIL import Image
+
+    # One byte per greyscale pixel, row by row
+    pixels = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(hash_size):
+        start = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[start + column] > pixels[start + column + 1])
+    return value
+
+
+def dhash_file(stream, hash_size=DHASH_SIZE):
+    """Difference hash of an encoded image"""
+    # Only hashing decodes images; PerceptualIndex itself works on plain integers
+    from PIL import Image
+
+    with Image.open(stream) as image:
+        image.draft("L", (DHASH_DRAFT_SIDE, DHASH_DRAFT_SIDE))
+        return dhash(image, hash_size)
+
+
+def hamming_distance(first, second):
+    return bin(first ^ second).count("1")
+
+
+def _neighbours(value, bits, radius):
+    """Yield every value within radius bit flips of value, itself included"""
+    for flips in range(radius + 1):
+        for positions in itertools.combinations(range(bits), flips):
+            probe = value
+            for position in positions:
+                probe ^= 1 << position
+            yield probe
+
+
+class MultiIndexHash:
+    """Hamming-space index that splits each hash into chunks, one lookup table per chunk
+
+    Two hashes within distance r differ by at most r // chunks bits in at least one chunk
+    (pigeonhole), so a search probes each table with the chunk's near neighbours and only
+    verifies the few hashes that collide, instead of scanning them all.
+    """
+
+    def __init__(self, bits=DHASH_SIZE ** 2, chunks=MIH_CHUNKS):
+        if bits % chunks:
+            raise ValueError("bits must be a multiple of chunks")
+        self.bits = bits
+        self.chunks = chunks
+        self.chunk_bits = bits // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables = [{} for _ in range(chunks)]
+        self._items = {}
+
+    def _chunk_values(self, value):
+        return [(value >> (index * self.chunk_bits)) & self._mask for index in range(self.chunks)]
+
+    @property
+    def size(self):
+        return len(self._items)
+
+    def add(self, value, item):
+        if item in self._items:
+            return
+        self._items[item] = value
+        for table, chunk in zip(self._tables, self._chunk_values(value)):
+            table.setdefault(chunk, set()).add(item)
+
+    def remove(self, item):
+        value = self._items.pop(item, None)
+        if value is None:
+            return
+        for table, chunk in zip(self._tables, self._chunk_values(value)):
+            members = table.get(chunk)
+            if members is not None:
+                members.discard(item)
+                if not members:
+                    del table[chunk]
+
+    def search(self, value, max_distance):
+        """Return (distance, item) pairs within max_distance, nearest first"""
+        radius = max_distance // self.chunks
+        candidates = set()
+        for table, chunk in zip(self._tables, self._chunk_values(value)):
+            for probe in _neighbours(chunk, self.chunk_bits, radius):
+                members = table.get(probe)
+                if members:
+                    candidates.update(members)
+        found = []
+        for item in candidates:
+            distance = hamming_distance(value, self._items[item])
+            if distance <= max_distance:
+                found.append((distance, item))
+        found.sort(key=lambda match: match[0])
+        return found
+
+
+class PerceptualIndex:
+    """Persistent map from screenshot dHashes to analysis cache keys, searched through a MultiIndexHash
+
+    namespace separates analyses made with different models or instructions. The in-memory
+    index is built from disk on first use and kept in memory.
+    """
+
+    def __init__(self, namespace, path=PHASH_DB_PATH, max_distance=PHASH_MAX_DISTANCE):
+        self.namespace = namespace
+        self.path = path
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._lock = threading.Lock()
+        self._connections = SQLiteConnections(path)
+        conn = self._connection()
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS image_hashes (
+                    cache_key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    dhash TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_image_hashes_namespace ON image_hashes (namespace);
+            """)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _loaded_index(self):
+        """Return the in-memory index, building it from disk the first time; caller holds the lock"""
+        if self._index is None:
+            index = MultiIndexHash()
+            rows = self._connection().execute(
+                "SELECT dhash, cache_key FROM image_hashes WHERE namespace = ?", (self.namespace,))
+            for value, cache_key in rows:
+                index.add(int(value, 16), cache_key)
+            self._index = index
+        return self._index
+
+    def add(self, value, cache_key):
+        """Record that the analysis stored under cache_key belongs to an image with this hash"""
+        conn = self._connection()
+        with conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO image_hashes (cache_key, namespace, dhash, created_at) VALUES (?, ?, ?, ?)",
+                (cache_key, self.namespace, format(value, "x"), time.time()),
+            ).rowcount
+        with self._lock:
+            # An unloaded index picks the row up from disk when it is built
+            if inserted and self._index is not None:
+                self._index.add(value, cache_key)
+
+    def find(self, value, max_distance=None):
+        """Return [(distance, cache_key)] for stored images within max_distance bits, nearest first"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        with self._lock:
+            matches = self._loaded_index().search(value, max_distance)
+            if matches:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return matches
+
+    def forget(self, cache_key):
+        """Drop a mapping whose analysis is no longer available"""
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT dhash FROM image_hashes WHERE cache_key = ?", (cache_key,)).fetchone()
+            conn.execute("DELETE FROM image_hashes WHERE cache_key = ?", (cache_key,))
+        if row is not None:
+            with self._lock:
+                self._loaded_index().remove(cache_key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hashes": self._index.size if self._index is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,373 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from storage_utils import SQLiteConnections
+
+PLANS_DIR = "project_plans"
+PLANS_DB_PATH = os.path.join(PLANS_DIR, "plans.db")
+PLAN_RETENTION_DAYS = 180
+PLAN_MAX_STORED = 100_000
+# Input hash -> plan ID lines kept next to the JSON plan files
+PLAN_INPUT_INDEX_FILE = "input_index.tsv"
+
+
+def write_json_atomic(path, data):
+    """Write JSON to path via a temp file and rename, so readers never see a partial file"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def new_plan_id():
+    """Return a time-sortable, collision-free plan ID"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}"
+
+
+def normalize_input(user_input):
+    """Collapse whitespace and case-fold so trivially different submissions compare equal"""
+    return " ".join(user_input.split()).casefold()
+
+
+def fingerprint_input(user_input):
+    """Hash the normalized user input for indexed and dedup lookups"""
+    return hashlib.sha256(normalize_input(user_input).encode("utf-8")).hexdigest()
+
+
+class SQLitePlanStore:
+    """Plan store backed by a WAL-mode SQLite database indexed by time, status and input hash"""
+
+    def __init__(self, path=PLANS_DB_PATH, retention_days=PLAN_RETENTION_DAYS,
+                 max_plans=PLAN_MAX_STORED, maintenance_interval=1000):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_plans = max_plans
+        self.maintenance_interval = maintenance_interval
+        self._saves = 0
+        # auto_vacuum only takes effect on a fresh database, before the switch to WAL and the
+        # first table; on an existing database it is a no-op
+        self._connections = SQLiteConnections(path, setup_pragmas=["auto_vacuum=INCREMENTAL"])
+
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS plans (
+                id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                status TEXT NOT NULL,
+                input_hash TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_plans_created_at ON plans (created_at);
+            CREATE INDEX IF NOT EXISTS idx_plans_status ON plans (status, id);
+            CREATE INDEX IF NOT EXISTS idx_plans_input_hash ON plans (input_hash, id);
+        """)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def save(self, plan_data):
+        """Insert or replace a plan record, returning its ID"""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO plans (id, created_at, status, input_hash, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    plan_data["id"],
+                    plan_data.get("created_at", time.time()),
+                    plan_data["status"],
+                    plan_data["input_hash"],
+                    json.dumps(plan_data, ensure_ascii=False),
+                ),
+            )
+        self._saves += 1
+        if self._saves % self.maintenance_interval == 0:
+            self.prune()
+        return plan_data["id"]
+
+    def get(self, plan_id):
+        """Return the plan with this ID, or None"""
+        row = self._connection().execute("SELECT data FROM plans WHERE id = ?", (plan_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_plans(self, status=None, limit=50, cursor=None):
+        """Return (plans, next_cursor), newest first; pass next_cursor back for the next page"""
+        query = "SELECT id, data FROM plans"
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        rows = self._connection().execute(query, params).fetchall()
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return [json.loads(data) for _, data in rows], next_cursor
+
+    def find_by_input_hash(self, input_hash, status=None):
+        """Return the newest plan generated from this input, or None"""
+        query = "SELECT data FROM plans WHERE input_hash = ?"
+        params = [input_hash]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        row = self._connection().execute(query + " ORDER BY id DESC LIMIT 1", params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prune(self):
+        """Apply the retention policy, then return freed pages to the filesystem"""
+        conn = self._connection()
+        deleted = 0
+        with conn:
+            if self.retention_days is not None:
+                cutoff = time.time() - self.retention_days * 24 * 60 * 60
+                deleted += conn.execute("DELETE FROM plans WHERE created_at < ?", (cutoff,)).rowcount
+            if self.max_plans is not None:
+                deleted += conn.execute(
+                    "DELETE FROM plans WHERE id NOT IN (SELECT id FROM plans ORDER BY id DESC LIMIT ?)",
+                    (self.max_plans,),
+                ).rowcount
+        if deleted:
+            self.compact()
+        return deleted
+
+    def compact(self):
+        """Reclaim free pages and truncate the WAL"""
+        conn = self._connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Databases created without incremental auto_vacuum need one full VACUUM to switch over
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        # execute() steps the pragma once, freeing a single page; executescript() runs it to completion
+        conn.executescript("PRAGMA incremental_vacuum;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+class PlanDeduplicator:
+    """Reuse stored plans for inputs already seen, including ones still queued for writing"""
+
+    def __init__(self, store, max_recent=1024):
+        self.store = store
+        self.max_recent = max_recent
+        self.hits = 0
+        self.misses = 0
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, fingerprint):
+        """Return the stored plan for this input fingerprint, or None"""
+        with self._lock:
+            plan_data = self._recent.get(fingerprint)
+            if plan_data is not None:
+                self._recent.move_to_end(fingerprint)
+        if plan_data is None:
+            plan_data = self.store.find_by_input_hash(fingerprint, status="validated")
+            if plan_data is not None:
+                self.remember(plan_data)
+        with self._lock:
+            if plan_data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return plan_data
+
+    def remember(self, plan_data):
+        """Make a freshly generated plan visible to lookups before it reaches the store"""
+        with self._lock:
+            self._recent[plan_data["input_hash"]] = plan_data
+            self._recent.move_to_end(plan_data["input_hash"])
+            while len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+    def stats(self):
+        """Return dedup hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class JsonFilePlanStore:
+    """Fallback store keeping the original one-JSON-file-per-plan layout
+
+    An append-only index file maps input hashes to plan IDs, so dedup lookups open one plan
+    instead of every file. Lines appended by other processes are picked up on the next lookup.
+    """
+
+    def __init__(self, directory=PLANS_DIR, retention_days=PLAN_RETENTION_DAYS,
+                 max_plans=PLAN_MAX_STORED, maintenance_interval=1000):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.max_plans = max_plans
+        self.maintenance_interval = maintenance_interval
+        self._saves = 0
+        self._lock = threading.Lock()
+        # input_hash -> {status: newest plan ID}; the None key holds the newest of any status
+        self._by_input = {}
+        self._index_offset = 0
+        self._index_path = os.path.join(directory, PLAN_INPUT_INDEX_FILE)
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self._index_path):
+            self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Write the index from the plan files themselves, for directories that predate it"""
+        entries = []
+        for plan_id in self._plan_ids():
+            plan = self.get(plan_id)
+            if plan and plan.get("input_hash"):
+                entries.append((plan["input_hash"], plan.get("status", ""), plan_id))
+        self._write_index(entries)
+
+    def _write_index(self, entries):
+        """Replace the index file with entries; caller holds the lock or owns the store"""
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{input_hash}\t{status}\t{plan_id}\n" for input_hash, status, plan_id in entries)
+        os.replace(tmp_path, self._index_path)
+        self._by_input = {}
+        self._index_offset = 0
+
+    def _remember(self, input_hash, status, plan_id):
+        entries = self._by_input.setdefault(input_hash, {})
+        for key in (status, None):
+            if entries.get(key) is None or entries[key] < plan_id:
+                entries[key] = plan_id
+
+    def _refresh_index(self):
+        """Read index lines appended since the last call; caller holds the lock"""
+        try:
+            with open(self._index_path, 'rb') as f:
+                f.seek(self._index_offset)
+                for line in f:
+                    # A torn last line is read again once its writer finishes it
+                    if not line.endswith(b"\n"):
+                        break
+                    self._index_offset += len(line)
+                    fields = line.decode("utf-8").rstrip("\n").split("\t")
+                    if len(fields) == 3:
+                        self._remember(*fields)
+        except FileNotFoundError:
+            pass
+
+    def _path(self, plan_id):
+        return os.path.join(self.directory, f"plan_{plan_id}.json")
+
+    def _plan_ids(self):
+        # IDs are time-sortable, so name order is creation order
+        with os.scandir(self.directory) as it:
+            names = [entry.name for entry in it
+                     if entry.name.startswith("plan_") and entry.name.endswith(".json")]
+        return sorted((name[len("plan_"):-len(".json")] for name in names), reverse=True)
+
+    def save(self, plan_data):
+        write_json_atomic(self._path(plan_data["id"]), plan_data)
+        with self._lock:
+            with open(self._index_path, 'a', encoding='utf-8') as f:
+                f.write(f"{plan_data['input_hash']}\t{plan_data['status']}\t{plan_data['id']}\n")
+            self._saves += 1
+            maintenance_due = self._saves % self.maintenance_interval == 0
+        if maintenance_due:
+            self.prune()
+        return plan_data["id"]
+
+    def get(self, plan_id):
+        try:
+            with open(self._path(plan_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_plans(self, status=None, limit=50, cursor=None):
+        plans = []
+        for plan_id in self._plan_ids():
+            if cursor is not None and plan_id >= cursor:
+                continue
+            plan = self.get(plan_id)
+            if plan is None or (status is not None and plan.get("status") != status):
+                continue
+            plans.append(plan)
+            if len(plans) == limit:
+                return plans, plan_id
+        return plans, None
+
+    def find_by_input_hash(self, input_hash, status=None):
+        with self._lock:
+            self._refresh_index()
+            plan_id = self._by_input.get(input_hash, {}).get(status)
+        if plan_id is None:
+            return None
+        plan = self.get(plan_id)
+        # The plan may have been pruned or re-saved with another status since it was indexed
+        if plan is None or plan.get("input_hash") != input_hash or (status is not None and plan.get("status") != status):
+            return None
+        return plan
+
+    def prune(self):
+        plan_ids = self._plan_ids()
+        expired = set(plan_ids[self.max_plans:]) if self.max_plans is not None else set()
+        if self.retention_days is not None:
+            cutoff = time.time() - self.retention_days * 24 * 60 * 60
+            for plan_id in plan_ids:
+                try:
+                    if os.path.getmtime(self._path(plan_id)) < cutoff:
+                        expired.add(plan_id)
+                except OSError:
+                    continue
+        for plan_id in expired:
+            try:
+                os.remove(self._path(plan_id))
+            except OSError:
+                pass
+        if expired:
+            # Drop index lines of removed plans and superseded entries
+            with self._lock:
+                self._refresh_index()
+                live = sorted({(input_hash, status, plan_id)
+                               for input_hash, entries in self._by_input.items()
+                               for status, plan_id in entries.items()
+                               if status is not None and plan_id not in expired})
+                self._write_index(live)
+        return len(expired)
+
+    def compact(self):
+        pass
+
+
+PLAN_STORE_BACKENDS = {
+    "sqlite": SQLitePlanStore,
+    "json": JsonFilePlanStore,
+}
+
+
+def open_plan_store(backend="sqlite", **options):
+    """Create a plan store for the named backend"""
+    try:
+        store_class = PLAN_STORE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown plan store backend: {backend}")
+    return store_class(**options)
@@ -0,0 +1,159 @@
+import math
+import re
+
+from log_ingest import ingest_log
+
+# Conservative average for mixed Spanish/English prose and code
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = "\n[... {omitted} tokens recortados ...]\n"
+# Words, numbers, and runs of punctuation each cost at least one token
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]+")
+
+
+class HeuristicTokenizer:
+    """Offline token estimate: one token per four characters of each word or punctuation run"""
+
+    def count(self, text):
+        return sum(
+            math.ceil(len(piece) / CHARS_PER_TOKEN) for piece in TOKEN_PATTERN.findall(text)
+        )
+
+
+class CharRatioTokenizer:
+    """Cheapest estimate, a fixed characters-per-token ratio"""
+
+    def __init__(self, chars_per_token=CHARS_PER_TOKEN):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text):
+        return math.ceil(len(text) / self.chars_per_token)
+
+
+TOKENIZERS = {
+    "heuristic": HeuristicTokenizer,
+    "chars": CharRatioTokenizer,
+}
+
+
+def get_tokenizer(name="heuristic"):
+    """Create a tokenizer by name; any object with count(text) can be used instead"""
+    try:
+        return TOKENIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown tokenizer: {name}")
+
+
+def truncate_text(text, max_tokens, tokenizer):
+    """Cut the middle of text so it fits max_tokens, keeping its start and end"""
+    total = tokenizer.count(text)
+    if total <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    marker_tokens = tokenizer.count(TRUNCATION_MARKER.format(omitted=total))
+    # Binary search the number of characters kept, split two thirds head, one third tail
+    low, high = 0, len(text)
+    while low < high:
+        keep = (low + high + 1) // 2
+        head_chars = keep * 2 // 3
+        candidate = text[:head_chars] + text[len(text) - (keep - head_chars):]
+        if tokenizer.count(candidate) + marker_tokens <= max_tokens:
+            low = keep
+        else:
+            high = keep - 1
+    head_chars = low * 2 // 3
+    head, tail = text[:head_chars], text[len(text) - (low - head_chars):]
+    omitted = total - tokenizer.count(head) - tokenizer.count(tail)
+    return head + TRUNCATION_MARKER.format(omitted=omitted) + tail
+
+
+def condense_text(text, max_tokens, tokenizer):
+    """Collapse repeated lines and keep error regions first, then cut the middle if still too long"""
+    if tokenizer.count(text) <= max_tokens:
+        return text
+    digest = ingest_log(text, budget_bytes=max_tokens * CHARS_PER_TOKEN)
+    return truncate_text(digest.text, max_tokens, tokenizer)
+
+
+class PromptSection:
+    """One part of a prompt with its priority (lower is kept first) and token limits
+
+    compress(text, max_tokens, tokenizer) shrinks the section; sections without it are
+    never shortened.
+    """
+
+    def __init__(self, name, text, priority, max_tokens=None, min_tokens=0, compress=truncate_text):
+        self.name = name
+        self.text = text
+        self.priority = priority
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.compress = compress
+
+
+class BudgetReport:
+    """Per-section token accounting for an assembled prompt"""
+
+    def __init__(self, budget_tokens, sections):
+        self.budget_tokens = budget_tokens
+        self.sections = sections
+
+    @property
+    def total_tokens(self):
+        return sum(section["tokens"] for section in self.sections)
+
+    @property
+    def over_budget(self):
+        return self.total_tokens > self.budget_tokens
+
+    def to_dict(self):
+        return {
+            "budget_tokens": self.budget_tokens,
+            "total_tokens": self.total_tokens,
+            "original_tokens": sum(section["original_tokens"] for section in self.sections),
+            "over_budget": self.over_budget,
+            "sections": [dict(section) for section in self.sections],
+        }
+
+
+def fit_sections(sections, budget_tokens, tokenizer):
+    """Shrink sections to their own limits, then lowest-priority first until the total fits
+
+    Returns ({name: fitted text}, BudgetReport).
+    """
+    texts, tokens, original = {}, {}, {}
+    for section in sections:
+        original[section.name] = tokenizer.count(section.text)
+        text = section.text
+        if section.compress is not None and section.max_tokens is not None:
+            text = section.compress(text, section.max_tokens, tokenizer)
+        texts[section.name] = text
+        tokens[section.name] = tokenizer.count(text) if text is not section.text else original[section.name]
+
+    excess = sum(tokens.values()) - budget_tokens
+    for section in sorted(sections, key=lambda candidate: candidate.priority, reverse=True):
+        if excess <= 0:
+            break
+        if section.compress is None:
+            continue
+        target = max(section.min_tokens, tokens[section.name] - excess)
+        if target >= tokens[section.name]:
+            continue
+        texts[section.name] = section.compress(texts[section.name], target, tokenizer)
+        shrunk = tokenizer.count(texts[section.name])
+        excess -= tokens[section.name] - shrunk
+        tokens[section.name] = shrunk
+
+    report = BudgetReport(budget_tokens, [
+        {
+            "name": section.name,
+            "priority": section.priority,
+            "original_tokens": original[section.name],
+            "tokens": tokens[section.name],
+            "chars": len(texts[section.name]),
+            "compressed": tokens[section.name] < original[section.name],
+        }
+        for section in sections
+    ])
+    return texts, report
@@ -0,0 +1,165 @@
+"""Generate prompts in bulk from a JSONL or CSV file of requirements.
+
+Example:
+    python prompt_cli.py requirements.jsonl -o prompts.jsonl --template debug --workers 8
+
+Rows that can't be processed are written as error records. The exit status is 1 when any
+row failed and 2 when the run itself failed.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import prompt_core
+
+INPUT_FIELDS = ("user_input", "requirement", "error_description")
+
+_persist = False
+
+
+class InvalidRow:
+    """Placeholder for an input line that could not be parsed, so it is reported in order"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _parse_json_row(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidRow(f"JSON inválido: {e}")
+
+
+def read_rows(path):
+    """Yield (row_number, row) pairs from a JSONL or CSV file without loading it whole"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (_parse_json_row(line) for line in f if line.strip())
+        for row_number, row in enumerate(rows, start=1):
+            yield row_number, row
+
+
+def _row_input(row, field):
+    if field:
+        return row.get(field)
+    for name in INPUT_FIELDS:
+        if row.get(name):
+            return row[name]
+    return None
+
+
+def _init_worker(persist):
+    global _persist
+    # Worker processes exit without draining a background queue, so write synchronously
+    prompt_core.PLAN_BACKGROUND_WRITES = False
+    _persist = persist
+
+
+def generate_batch(batch, template_name, field):
+    """Generate prompts for a batch of rows inside a worker process"""
+    results = []
+    for row_number, row in batch:
+        record = {"row": row_number, "id": None}
+        # Any problem with a single row becomes an error record; the rest of the run goes on
+        try:
+            if isinstance(row, InvalidRow):
+                raise prompt_core.PromptGenerationError(row.error)
+            if not isinstance(row, dict):
+                raise prompt_core.PromptGenerationError("La fila no es un objeto JSON")
+            record["id"] = row.get("id")
+            user_input = _row_input(row, field)
+            template_key = row.get("template") or template_name
+            template = prompt_core.TEMPLATES.get(template_key)
+            if template is None:
+                raise prompt_core.PromptGenerationError(f"Plantilla desconocida: {template_key}")
+            if not user_input:
+                raise prompt_core.PromptGenerationError("Fila sin requerimiento")
+            result = prompt_core.generate_prompt(user_input, template=template, persist=_persist)
+            record.update(prompt=result.prompt, plan_id=result.plan_id, reused=result.reused,
+                          size_report=result.size_report)
+        except Exception as e:
+            record["error"] = str(e)
+        results.append(record)
+    return results
+
+
+def run(input_path, output, template_name, field=None, workers=None, batch_size=64, persist=False):
+    """Stream rows through a process pool, writing results in input order; returns a summary"""
+    workers = workers or os.cpu_count() or 1
+    # Keep a bounded number of batches in flight so memory stays flat for any input size
+    max_in_flight = workers * 2
+    rows = read_rows(input_path)
+    summary = {"rows": 0, "ok": 0, "failed": 0, "bytes": 0}
+    started = time.perf_counter()
+
+    def write(results):
+        for record in results:
+            summary["rows"] += 1
+            if "error" in record:
+                summary["failed"] += 1
+            else:
+                summary["ok"] += 1
+                summary["bytes"] += len(record["prompt"])
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(persist,)) as pool:
+        in_flight = deque()
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if batch:
+                in_flight.append(pool.submit(generate_batch, batch, template_name, field))
+            if in_flight and (len(in_flight) >= max_in_flight or not batch):
+                write(in_flight.popleft().result())
+            if not batch and not in_flight:
+                break
+
+    summary["seconds"] = time.perf_counter() - started
+    summary["rows_per_second"] = summary["rows"] / summary["seconds"] if summary["seconds"] else 0.0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL or CSV file with one requirement per row")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--template", choices=sorted(prompt_core.TEMPLATES), default="development",
+                        help="Template for rows without a 'template' column")
+    parser.add_argument("--field", help=f"Column holding the requirement (default: first of {', '.join(INPUT_FIELDS)})")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Rows per worker task")
+    parser.add_argument("--persist", action="store_true",
+                        help="Save plans to the plan store and reuse identical earlier requests")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        summary = run(args.input, output, args.template, field=args.field, workers=args.workers,
+                      batch_size=args.batch_size, persist=args.persist)
+    except Exception as e:
+        # A failure outside a single row (unreadable input, crashed worker) fails the whole run
+        print(f"❌ La ejecución falló: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(
+        f"{summary['rows']} filas ({summary['ok']} ok, {summary['failed']} con error) en "
+        f"{summary['seconds']:.1f} s · {summary['rows_per_second']:.0f} filas/s · "
+        f"{summary['bytes'] / 1024 / 1024:.1f} MB generados",
+        file=sys.stderr,
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,627 @@
+"""UI-free prompt generation core shared by the Streamlit app, the CLI and scripts."""
+import functools
+import hashlib
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import datetime
+
+from analysis_cache import AnalysisCache, make_cache_key
+from artifact_log import ARTIFACT_LOG_DIR, ArtifactLog
+from file_registry import INLINE_IMAGE_MAX_BYTES
+from gemini_client import GEMINI_MODEL_NAME, get_gemini_client
+from image_pipeline import image_buffer, image_stream, preprocess_image, upload_image
+from incident_index import SIMILAR_INCIDENTS_TOP_K, IncidentIndex
+from perceptual_hash import PHASH_MAX_DISTANCE, PerceptualIndex, dhash_file
+from plan_store import PlanDeduplicator, fingerprint_input, new_plan_id, open_plan_store
+from prompt_budget import PromptSection, condense_text, fit_sections, get_tokenizer
+from prompt_templates import DEBUG_TEMPLATE, DEVELOPMENT_TEMPLATE, render_cached
+from search_index import SearchIndex
+from storage_utils import BackgroundWriter
+from tracing import span, traced
+
+IMAGE_ANALYSIS_MAX_WORKERS = 4
+IMAGE_ANALYSIS_TIMEOUT_SECONDS = 120
+IMAGE_ANALYSIS_INSTRUCTION = (
+    "Analiza esta imagen de error y proporciona una descripción detallada del problema que muestra. " +
+    "Incluye cualquier mensaje de error, stack trace o información relevante que observes."
+)
+# Reuse the analysis of a screenshot whose dHash differs by at most this many bits (None: exact matches only).
+# Off by default: dHash sees layout, not text, so different errors in the same dialog can hash identically
+IMAGE_NEAR_DUPLICATE_MAX_DISTANCE = None
+# Suggested tolerance for callers that opt in
+IMAGE_NEAR_DUPLICATE_SUGGESTED_DISTANCE = PHASH_MAX_DISTANCE
+
+# Plan management
+PLAN_STORE_BACKEND = "sqlite"  # "json" keeps the legacy one-file-per-plan layout
+# Persist plans off the script thread
+PLAN_BACKGROUND_WRITES = True
+PLAN_VALIDATION_RULES = {
+    "required_sections": [
+        "analysis",
+        "components",
+        "implementation_steps",
+        "technical_considerations",
+        "testing"
+    ]
+}
+# Debug plans go to an append-only segmented log instead of loose files in the CWD
+DEBUG_PLAN_LOG_DIR = ARTIFACT_LOG_DIR
+# Index stored plans, debug plans and image analyses for full-text search
+SEARCH_INDEX_ENABLED = True
+SEARCH_TITLE_MAX_CHARS = 120
+
+# Prompt size limits, in estimated tokens (the target model accepts about 32k input tokens)
+PROMPT_MAX_TOKENS = 30_000
+PROMPT_INPUT_MAX_TOKENS = 20_000
+PROMPT_INPUT_MIN_TOKENS = 2_000
+PROMPT_TOKENIZER = "heuristic"
+
+TEMPLATES = {
+    DEVELOPMENT_TEMPLATE.name: DEVELOPMENT_TEMPLATE,
+    DEBUG_TEMPLATE.name: DEBUG_TEMPLATE,
+}
+
+
+class PromptGenerationError(Exception):
+    """Raised when a prompt can't be generated; the message is meant for the user"""
+
+
+class PromptResult:
+    """Generated prompt together with the plan it was built from"""
+
+    def __init__(self, prompt, plan_id, reused, size_report=None):
+        self.prompt = prompt
+        self.plan_id = plan_id
+        self.reused = reused
+        # Token accounting per prompt section (BudgetReport.to_dict()); None for older plans
+        self.size_report = size_report
+
+
+@functools.lru_cache(maxsize=None)
+def get_analysis_cache():
+    """Return the process-wide image analysis cache"""
+    return AnalysisCache()
+
+
+@functools.lru_cache(maxsize=None)
+def get_index_writer():
+    """Return the process-wide queue that updates the search and incident indexes"""
+    return BackgroundWriter(name="index-writer")
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_index():
+    """Return the process-wide full-text search index"""
+    return SearchIndex()
+
+
+def _add_to_search_index(doc_id, kind, title, body, created_at):
+    get_search_index().add(doc_id, kind, title, body, created_at)
+
+
+def index_document(doc_id, kind, body, title=None, created_at=None):
+    """Queue a stored document for the search index; indexing runs on the index writer"""
+    if not SEARCH_INDEX_ENABLED:
+        return
+    if title is None:
+        title = body.strip().split("\n", 1)[0][:SEARCH_TITLE_MAX_CHARS]
+    get_index_writer().submit(_add_to_search_index, doc_id, kind, title, body, created_at)
+
+
+@functools.lru_cache(maxsize=None)
+def get_perceptual_index(cache_dir):
+    """Return the near-duplicate screenshot index that lives next to an analysis cache"""
+    namespace = make_cache_key(b"", GEMINI_MODEL_NAME, IMAGE_ANALYSIS_INSTRUCTION)[:16]
+    return PerceptualIndex(namespace, path=os.path.join(cache_dir, "phash.db"))
+
+
+def find_near_duplicate_analysis(image_file, cache, max_distance):
+    """Return (dhash, analysis, distance) for the closest stored screenshot with a cached analysis"""
+    index = get_perceptual_index(cache.cache_dir)
+    image_hash = dhash_file(image_stream(image_file))
+    for distance, match_key in index.find(image_hash, max_distance):
+        analysis = cache.get(match_key)
+        if analysis is not None:
+            return image_hash, analysis, distance
+        # The analysis was evicted from the cache; stop matching against it
+        index.forget(match_key)
+    return image_hash, None, None
+
+
+def image_part(client, prepared):
+    """Return (content part, how it was sent) for a preprocessed image: inline, uploaded or reused"""
+    if len(prepared.data) <= INLINE_IMAGE_MAX_BYTES:
+        return {"mime_type": prepared.mime_type, "data": prepared.data}, "inline"
+
+    def upload():
+        return upload_image(client.upload_file, prepared.data, mime_type=prepared.mime_type)
+
+    files = getattr(client, "files", None)
+    if files is None:
+        return upload(), "uploaded"
+    handle, reused = files.get_or_upload(prepared.data, prepared.mime_type, upload)
+    return handle, "reused" if reused else "uploaded"
+
+
+def run_image_analysis(image_file, client, cache, on_chunk=None, cancel_event=None,
+                       near_duplicate_distance=IMAGE_NEAR_DUPLICATE_MAX_DISTANCE, indexer=index_document):
+    """Analyze one error image, returning the analysis text, preprocessing stats and timings
+
+    New analyses are passed to indexer (index_document's signature) for search; None skips indexing.
+    """
+    with span("image.analyze"):
+        # Serve repeated screenshots from the content-addressed cache
+        with span("image.cache_lookup") as lookup:
+            image_bytes = image_buffer(image_file)
+            cache_key = make_cache_key(image_bytes, GEMINI_MODEL_NAME, IMAGE_ANALYSIS_INSTRUCTION)
+            cached_analysis = cache.get(cache_key)
+            lookup.set(bytes=len(image_bytes), cache_hit=cached_analysis is not None)
+        if cached_analysis is not None:
+            return cached_analysis, None, None
+
+        # Crops, cursors and re-encoding change the bytes; look for a perceptually close screenshot
+        image_hash = None
+        if near_duplicate_distance is not None and hasattr(cache, "cache_dir"):
+            with span("image.near_duplicate_lookup") as near:
+                image_hash, near_analysis, distance = find_near_duplicate_analysis(
+                    image_file, cache, near_duplicate_distance)
+                near.set(cache_hit=near_analysis is not None, distance=distance)
+            if near_analysis is not None:
+                # Borrowed, not cached under this image's key: exact lookups must never return it
+                # once near-duplicate reuse is switched off
+                return near_analysis, None, {"time_to_first_token": None, "total": None,
+                                             "near_duplicate_distance": distance}
+
+        # Downscale and re-encode before upload
+        with span("image.preprocess") as preprocess:
+            prepared = preprocess_image(image_file)
+            preprocess.set(bytes=len(image_bytes), output_bytes=len(prepared.data))
+
+        # Send small images inline; upload larger ones once and reuse the handle
+        with span("image.upload", bytes=len(prepared.data)) as upload:
+            image, transfer = image_part(client, prepared)
+            upload.set(transfer=transfer)
+            if transfer != "inline":
+                upload.set(cache_hit=transfer == "reused")
+        started = time.perf_counter()
+        timings = {"time_to_first_token": None, "total": None}
+        with span("image.inference", streamed=on_chunk is not None) as inference:
+            if on_chunk is None:
+                response = client.generate_content(
+                    [image, IMAGE_ANALYSIS_INSTRUCTION],
+                    request_options={"timeout": IMAGE_ANALYSIS_TIMEOUT_SECONDS},
+                )
+                text = response.text
+                timings["time_to_first_token"] = time.perf_counter() - started
+            else:
+                response = client.generate_content(
+                    [image, IMAGE_ANALYSIS_INSTRUCTION],
+                    stream=True,
+                    request_options={"timeout": IMAGE_ANALYSIS_TIMEOUT_SECONDS},
+                )
+                parts = []
+                for chunk in response:
+                    if cancel_event is not None and cancel_event.is_set():
+                        # The page was left mid-stream: stop consuming and don't cache a partial answer
+                        inference.set(cancelled=True)
+                        return None, prepared.stats(), timings
+                    try:
+                        chunk_text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. finish or safety metadata)
+                        continue
+                    if timings["time_to_first_token"] is None:
+                        timings["time_to_first_token"] = time.perf_counter() - started
+                    parts.append(chunk_text)
+                    on_chunk(chunk_text)
+                text = "".join(parts)
+            timings["total"] = time.perf_counter() - started
+            inference.set(bytes=len(text.encode("utf-8")), time_to_first_token_ms=round(
+                (timings["time_to_first_token"] or 0) * 1000, 3))
+
+        cache.put(cache_key, text, model_name=GEMINI_MODEL_NAME)
+        if hasattr(cache, "cache_dir"):
+            # Index every fresh analysis so later lookups can match it whatever the current setting
+            if image_hash is None:
+                image_hash = dhash_file(image_stream(image_file))
+            get_perceptual_index(cache.cache_dir).add(image_hash, cache_key)
+        if indexer is not None:
+            indexer(cache_key, "image_analysis", text, title=getattr(image_file, "name", None))
+        return text, prepared.stats(), timings
+
+
+def _pump_chunks(chunks, futures, deadline, on_progress):
+    """Forward streamed chunks to the UI callback on the script thread until all images finish"""
+    texts = {}
+    def forward(index, chunk_text):
+        texts[index] = texts.get(index, "") + chunk_text
+        on_progress(index, texts[index])
+
+    while time.monotonic() < deadline and not all(future.done() for future in futures):
+        try:
+            forward(*chunks.get(timeout=0.1))
+        except queue.Empty:
+            continue
+    while True:
+        try:
+            forward(*chunks.get_nowait())
+        except queue.Empty:
+            return
+
+
+def analyze_error_images(image_files, api_key, max_workers=IMAGE_ANALYSIS_MAX_WORKERS,
+                         timeout=IMAGE_ANALYSIS_TIMEOUT_SECONDS, on_progress=None,
+                         client_factory=get_gemini_client, cache=None,
+                         near_duplicate_distance=IMAGE_NEAR_DUPLICATE_MAX_DISTANCE, indexer=index_document):
+    """Analyze several error images concurrently, tolerating per-image failures
+
+    When on_progress is given, responses are streamed and on_progress(index, text_so_far)
+    is called on the script thread as chunks arrive. client_factory and cache can be
+    swapped for offline runs (see gemini_stub), and indexer (None to skip search indexing)
+    along with them. Screenshots within near_duplicate_distance dHash bits of an analyzed
+    one reuse its analysis (None disables this).
+    """
+    # Resolve shared resources on the script thread; workers have no Streamlit context
+    client = client_factory(api_key)
+    cache = cache if cache is not None else get_analysis_cache()
+    chunks = queue.Queue()
+    cancel_event = threading.Event()
+
+    def chunk_sink(index):
+        return lambda chunk_text: chunks.put((index, chunk_text))
+
+    results = []
+    workers = max(1, min(max_workers, len(image_files)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [
+            executor.submit(
+                # Each worker records its spans into the caller's trace
+                traced(run_image_analysis), image_file, client, cache,
+                on_chunk=chunk_sink(index) if on_progress else None,
+                cancel_event=cancel_event,
+                near_duplicate_distance=near_duplicate_distance,
+                indexer=indexer,
+            )
+            for index, image_file in enumerate(image_files)
+        ]
+        # Each queued wave of images gets its own timeout window
+        deadline = time.monotonic() + timeout * math.ceil(len(image_files) / workers)
+        if on_progress is not None:
+            _pump_chunks(chunks, futures, deadline, on_progress)
+        for image_file, future in zip(image_files, futures):
+            result = {"name": image_file.name, "analysis": None, "stats": None, "timings": None, "error": None}
+            try:
+                result["analysis"], result["stats"], result["timings"] = future.result(
+                    timeout=max(0, deadline - time.monotonic())
+                )
+            except FuturesTimeoutError:
+                future.cancel()
+                result["error"] = "Tiempo de espera agotado"
+            except Exception as e:
+                result["error"] = str(e)
+            results.append(result)
+    finally:
+        # Also runs when a rerun interrupts the script, so in-flight streams are abandoned
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def merge_image_analyses(results):
+    """Merge successful per-image analyses into a single report section"""
+    analyzed = [result for result in results if result["analysis"]]
+    if len(analyzed) == 1:
+        return analyzed[0]["analysis"]
+    return "\n\n".join(
+        f"[Imagen {index}: {result['name']}]\n{result['analysis']}"
+        for index, result in enumerate(analyzed, start=1)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_prompt_tokenizer():
+    """Return the tokenizer used to budget prompts"""
+    return get_tokenizer(PROMPT_TOKENIZER)
+
+
+@functools.lru_cache(maxsize=None)
+def get_plan_writer():
+    """Return the process-wide background plan writer"""
+    return BackgroundWriter(name="plan-writer")
+
+
+@functools.lru_cache(maxsize=None)
+def get_plan_store():
+    """Return the process-wide plan store"""
+    return open_plan_store(PLAN_STORE_BACKEND)
+
+
+@functools.lru_cache(maxsize=None)
+def get_debug_plan_log():
+    """Return the process-wide debug plan artifact log"""
+    return ArtifactLog(DEBUG_PLAN_LOG_DIR)
+
+
+@functools.lru_cache(maxsize=None)
+def get_incident_index():
+    """Return the process-wide similar-incident index"""
+    return IncidentIndex()
+
+
+def _add_incident(error_text, plan_id, image_analysis):
+    get_incident_index().add(error_text, plan_id=plan_id, image_analysis=image_analysis)
+
+
+def record_incident(error_text, plan_id, image_analysis=None):
+    """Queue a debug incident for similarity lookups; indexing runs on the index writer"""
+    get_index_writer().submit(_add_incident, error_text, plan_id, image_analysis)
+
+
+def find_similar_incidents(error_text, k=SIMILAR_INCIDENTS_TOP_K):
+    """Return past incidents resembling error_text, most similar first"""
+    with span("incident.lookup", bytes=len(error_text)) as lookup:
+        incidents = get_incident_index().query(error_text, k=k)
+        lookup.set(results=len(incidents), cache_hit=bool(incidents))
+    return incidents
+
+
+@functools.lru_cache(maxsize=None)
+def get_plan_deduplicator():
+    """Return the process-wide plan deduplicator"""
+    return PlanDeduplicator(get_plan_store())
+
+
+def build_plan_data(user_input, plan_content):
+    """Assemble the plan record that gets persisted"""
+    now = datetime.now()
+    return {
+        "id": new_plan_id(),
+        "user_input": user_input,
+        "input_hash": fingerprint_input(user_input),
+        "timestamp": now.strftime("%Y%m%d_%H%M%S"),
+        "created_at": now.timestamp(),
+        "plan": {
+            "analysis": plan_content.get("analysis", []),
+            "components": plan_content.get("components", []),
+            "implementation_steps": plan_content.get("implementation_steps", []),
+            "technical_considerations": plan_content.get("technical_considerations", []),
+            "testing": plan_content.get("testing", [])
+        },
+        "status": "pending_validation"
+    }
+
+
+def validate_plan(plan_data):
+    """Validate that the plan meets all requirements, marking it validated in memory"""
+    for section in PLAN_VALIDATION_RULES["required_sections"]:
+        if section not in plan_data["plan"] or not plan_data["plan"][section]:
+            return False, f"Missing or empty required section: {section}"
+
+    plan_data["status"] = "validated"
+    return True, "Plan validation successful"
+
+
+def persist_plan(plan_data):
+    """Persist a validated plan exactly once, returning its ID"""
+    store = get_plan_store()
+    with span("plan.persist", background=PLAN_BACKGROUND_WRITES):
+        if PLAN_BACKGROUND_WRITES:
+            get_plan_writer().submit(store.save, plan_data)
+        else:
+            store.save(plan_data)
+    index_document(plan_data["id"], "plan", f"{plan_data['user_input']}\n\n{format_plan(plan_data['plan'])}",
+                   created_at=plan_data.get("created_at"))
+
+    return plan_data["id"]
+
+
+def generate_plan(user_input):
+    """Generate a detailed plan based on user input."""
+    plan_content = {
+        "analysis": [
+            "Analyzing user requirements...",
+            "Identifying key components...",
+            "Determining technical constraints..."
+        ],
+        "components": [
+            "List required components...",
+            "Define component interactions...",
+            "Specify dependencies..."
+        ],
+        "implementation_steps": [
+            "Break down implementation steps...",
+            "Define order of operations...",
+            "Identify potential challenges..."
+        ],
+        "technical_considerations": [
+            "Performance requirements...",
+            "Security considerations...",
+            "Scalability factors..."
+        ],
+        "testing": [
+            "Unit testing strategy...",
+            "Integration testing approach...",
+            "Validation criteria..."
+        ]
+    }
+    
+    # Validate in memory; the caller persists it once together with the rendered prompt
+    plan_data = build_plan_data(user_input, plan_content)
+    is_valid, message = validate_plan(plan_data)
+    if not is_valid:
+        raise ValueError(f"Plan validation failed: {message}")
+    
+    return plan_data
+
+
+def format_plan(plan):
+    """Render the plan as compact bullet lists instead of a dict repr"""
+    lines = []
+    for section, items in plan.items():
+        lines.append(f"{section}:")
+        lines.extend(f"- {item}" for item in items)
+    return "\n".join(lines)
+
+
+def generate_xml_structure():
+    """Instructions to convert the detailed plan into XML project structure."""
+    # The plan is already in the prompt right above; don't pay for it twice
+    xml_prompt = """Convierte el PLAN DETALLADO anterior en un proyecto XML estructurado.
+
+Utiliza la estructura:
+<proyecto id="..." titulo="...">
+  <tarea id="..." titulo="...">
+    <subtarea id="..." titulo="...">
+      Descripción detallada...
+    </subtarea>
+  </tarea>
+</proyecto>"""
+    
+    return xml_prompt
+
+
+def prompt_config_digest(template):
+    """Fingerprint everything besides the input that shapes a rendered prompt"""
+    config = [template.source, generate_xml_structure(), PROMPT_MAX_TOKENS, PROMPT_INPUT_MAX_TOKENS,
+              PROMPT_INPUT_MIN_TOKENS, PROMPT_TOKENIZER]
+    return hashlib.sha256(json.dumps(config).encode("utf-8")).hexdigest()
+
+
+def generate_prompt(user_input, template=DEVELOPMENT_TEMPLATE, persist=True):
+    """Generate the final prompt for user_input, reusing identical earlier requests"""
+    # Sanitize user input
+    user_input = user_input.strip()
+    if not user_input:
+        raise PromptGenerationError("El input del usuario no puede estar vacío")
+
+    # Reuse the plan and prompt of an identical earlier request
+    deduplicator = get_plan_deduplicator() if persist else None
+    with span("prompt.dedup_lookup", bytes=len(user_input)) as lookup:
+        plan_data = deduplicator.lookup(fingerprint_input(user_input)) if deduplicator else None
+        lookup.set(cache_hit=plan_data is not None)
+    config_digest = prompt_config_digest(template)
+    if plan_data is not None:
+        cached_prompt = plan_data.get("prompts", {}).get(template.name)
+        # Prompts stored before the template or budget settings changed are rendered again
+        if cached_prompt is not None and plan_data.get("prompt_digests", {}).get(template.name) == config_digest:
+            size_report = plan_data.get("size_reports", {}).get(template.name)
+            return PromptResult(cached_prompt, plan_data["id"], reused=True, size_report=size_report)
+        # Copy before adding this template's prompt; the stored record may still be queued
+        plan_data = dict(
+            plan_data,
+            prompts=dict(plan_data.get("prompts", {})),
+            size_reports=dict(plan_data.get("size_reports", {})),
+            prompt_digests=dict(plan_data.get("prompt_digests", {})),
+        )
+    else:
+        # Generate and validate plan first
+        try:
+            with span("prompt.plan"):
+                plan_data = generate_plan(user_input)
+        except Exception as e:
+            raise PromptGenerationError(f"❌ Failed to generate or validate plan: {str(e)}") from e
+    plan_content = plan_data["plan"]
+
+    # Generate XML structure only if plan is valid
+    try:
+        xml_structure = generate_xml_structure()
+    except Exception as e:
+        raise PromptGenerationError(f"❌ Failed to generate XML structure: {str(e)}") from e
+
+    # Fit the sections into the token budget, shrinking the least important ones first
+    sections = [
+        PromptSection("plantilla", render_cached(template, user_input=""), priority=0, compress=None),
+        PromptSection("xml", xml_structure.strip(), priority=1),
+        PromptSection("plan", format_plan(plan_content), priority=2),
+        PromptSection("entrada", user_input, priority=3, max_tokens=PROMPT_INPUT_MAX_TOKENS,
+                      min_tokens=PROMPT_INPUT_MIN_TOKENS, compress=condense_text),
+    ]
+    with span("prompt.budget") as budget:
+        texts, report = fit_sections(sections, PROMPT_MAX_TOKENS, get_prompt_tokenizer())
+        budget.set(tokens=report.total_tokens, original_tokens=sum(
+            section["original_tokens"] for section in report.sections))
+
+    # Combine everything into the final prompt
+    try:
+        # Construir el prompt por partes para mejor control de errores
+        prompt_parts = []
+
+        # Parte 1: Prompt base de la pestaña (desarrollo o depuración)
+        with span("prompt.render", template=template.name) as render:
+            prompt_parts.append(render_cached(template, user_input=texts["entrada"]))
+            render.set(bytes=len(prompt_parts[-1]))
+
+        # Parte 2: Plan detallado
+        prompt_parts.append("\n\nPLAN DETALLADO:")
+        prompt_parts.append(texts["plan"])
+
+        # Parte 3: Estructura XML
+        prompt_parts.append("\n\nESTRUCTURA XML:")
+        prompt_parts.append(texts["xml"])
+
+        # Unir todas las partes
+        final_prompt = "\n".join(prompt_parts)
+    except Exception as e:
+        raise PromptGenerationError(
+            f"❌ Error en el formato del prompt: {str(e)}\n"
+            f"Debug info:\nUser input: {user_input}\nPlan content length: {len(str(plan_content))}\n"
+            f"XML structure length: {len(xml_structure)}"
+        ) from e
+
+    # Persist plan and prompt together, once
+    size_report = report.to_dict()
+    plan_data.setdefault("prompts", {})[template.name] = final_prompt
+    plan_data.setdefault("size_reports", {})[template.name] = size_report
+    plan_data.setdefault("prompt_digests", {})[template.name] = config_digest
+    if persist:
+        persist_plan(plan_data)
+        deduplicator.remember(plan_data)
+
+    return PromptResult(final_prompt, plan_data["id"], reused=False, size_report=size_report)
+
+
+def generate_debug_plan(error_description):
+    """Generate a debug plan based on error description, returning (plan_id, plan_content)"""
+    plan_content = {
+        "analysis": {
+            "error_description": error_description,
+            "potential_causes": [],
+            "affected_areas": []
+        },
+        "diagnostic_steps": [],
+        "test_strategy": [],
+        "risk_considerations": []
+    }
+    
+    # Append the debug plan to the artifact log
+    plan_id = new_plan_id()
+    plan_markdown = f"""# Plan de Depuración
+## Error Reportado
+{error_description}
+
+## Análisis Inicial
+[Pendiente de aprobación]
+
+## Pasos de Diagnóstico
+[Pendiente de aprobación]
+
+## Estrategia de Pruebas
+[Pendiente de aprobación]
+
+⚠️ Este plan requiere aprobación antes de proceder."""
+    with span("debug_plan.append"):
+        get_debug_plan_log().append(plan_id, plan_markdown)
+    index_document(plan_id, "debug_plan", plan_markdown, title=error_description.strip()[:SEARCH_TITLE_MAX_CHARS])
+
+    return plan_id, plan_content
+
+
+def load_debug_plan(plan_id):
+    """Return the Markdown of a stored debug plan, or None if it is unknown or was pruned"""
+    return get_debug_plan_log().get(plan_id)
@@ -0,0 +1,224 @@
+"""ASGI service exposing prompt generation and image analysis over HTTP.
+
+Run with: uvicorn prompt_service:app --port 8000
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import prompt_core
+from gemini_client import get_gemini_client
+from plan_store import fingerprint_input
+from resilience import CallDeadlineExceeded, CircuitOpenError
+from tracing import configure_json_logging, metrics, start_trace, traced
+
+SERVICE_WORKERS = 8
+SERVICE_MAX_PENDING = 64
+SERVICE_MAX_BODY_BYTES = 25 * 1024 * 1024
+SERVICE_RETRY_AFTER_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.headers = list(headers)
+
+
+class PromptService:
+    """Dependency-free ASGI app with a bounded worker pool and in-flight request coalescing"""
+
+    def __init__(self, client_factory=get_gemini_client, analysis_cache=None, persist=True,
+                 workers=SERVICE_WORKERS, max_pending=SERVICE_MAX_PENDING,
+                 near_duplicate_distance=prompt_core.IMAGE_NEAR_DUPLICATE_MAX_DISTANCE):
+        self.client_factory = client_factory
+        self.analysis_cache = analysis_cache
+        self.persist = persist
+        self.near_duplicate_distance = near_duplicate_distance
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prompt-service")
+        self._pending = 0
+        self._in_flight = {}
+        self.counters = {"requests": 0, "coalesced": 0, "rejected": 0, "errors": 0}
+        self._routes = {
+            ("POST", "/v1/prompts/development"): self._development_prompt,
+            ("POST", "/v1/prompts/debug"): self._debug_prompt,
+            ("POST", "/v1/images/analyze"): self._analyze_image,
+            ("GET", "/healthz"): self._health,
+            ("GET", "/metrics"): self._metrics,
+            ("GET", "/metrics/prometheus"): self._prometheus_metrics,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        self.counters["requests"] += 1
+        try:
+            handler = self._routes.get((scope["method"], scope["path"]))
+            if handler is None:
+                raise HTTPError(404, "Ruta no encontrada")
+            body = await self._read_body(receive)
+            headers = {name.decode("latin-1").lower(): value.decode("latin-1")
+                       for name, value in scope.get("headers", [])}
+            with start_trace(f"{scope['method']} {scope['path']}"):
+                status, payload = 200, await handler(body, headers)
+            extra_headers = []
+        except HTTPError as e:
+            status, payload, extra_headers = e.status, {"error": str(e)}, e.headers
+            if e.status >= 500:
+                self.counters["errors"] += 1
+        except Exception:
+            # Exception text can carry internals (paths, upstream responses); keep it in the logs
+            logger.exception("Unhandled error in %s %s", scope["method"], scope["path"])
+            self.counters["errors"] += 1
+            status, payload, extra_headers = 500, {"error": "Error interno del servidor"}, []
+
+        if isinstance(payload, str):
+            data, content_type = payload.encode("utf-8"), b"text/plain; version=0.0.4; charset=utf-8"
+        else:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            content_type = b"application/json; charset=utf-8"
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type),
+                        (b"content-length", str(len(data)).encode())] + extra_headers,
+        })
+        await send({"type": "http.response.body", "body": data})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                configure_json_logging()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > SERVICE_MAX_BODY_BYTES:
+                raise HTTPError(413, "Cuerpo de la petición demasiado grande")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def _run(self, key, func, *args):
+        """Run func on the worker pool, sharing one execution among identical in-flight requests"""
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        if self._pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise HTTPError(429, "Servicio saturado, reintenta más tarde",
+                            headers=[(b"retry-after", str(SERVICE_RETRY_AFTER_SECONDS).encode())])
+
+        loop = asyncio.get_running_loop()
+        # run_in_executor doesn't carry contextvars over; bind the request's trace explicitly
+        future = loop.run_in_executor(self._executor, traced(func), *args)
+        self._in_flight[key] = future
+        self._pending += 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._pending -= 1
+            self._in_flight.pop(key, None)
+
+    def _parse_json(self, body):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "JSON inválido")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "El cuerpo debe ser un objeto JSON")
+        return payload
+
+    async def _prompt(self, template, body):
+        user_input = self._parse_json(body).get("user_input")
+        if not isinstance(user_input, str) or not user_input.strip():
+            raise HTTPError(400, "user_input debe ser un texto no vacío")
+        key = ("prompt", template.name, fingerprint_input(user_input))
+        # Input is validated above, so a PromptGenerationError here is a server-side failure (500)
+        result = await self._run(key, self._generate_prompt, user_input, template)
+        return {"prompt": result.prompt, "plan_id": result.plan_id, "reused": result.reused,
+                "size_report": result.size_report}
+
+    def _generate_prompt(self, user_input, template):
+        return prompt_core.generate_prompt(user_input, template=template, persist=self.persist)
+
+    async def _development_prompt(self, body, headers):
+        return await self._prompt(prompt_core.DEVELOPMENT_TEMPLATE, body)
+
+    async def _debug_prompt(self, body, headers):
+        return await self._prompt(prompt_core.DEBUG_TEMPLATE, body)
+
+    async def _analyze_image(self, body, headers):
+        api_key = headers.get("x-gemini-api-key")
+        if not api_key:
+            raise HTTPError(401, "Falta la cabecera X-Gemini-Api-Key")
+        if not body:
+            raise HTTPError(400, "El cuerpo debe contener la imagen")
+        key = ("image", hashlib.sha256(api_key.encode("utf-8") + b"\0" + body).hexdigest())
+        try:
+            analysis, stats, timings = await self._run(key, self._run_image_analysis, body, api_key)
+        except CircuitOpenError as e:
+            raise HTTPError(503, "Gemini no está disponible, reintenta más tarde",
+                            headers=[(b"retry-after", str(math.ceil(e.retry_after)).encode())])
+        except CallDeadlineExceeded:
+            raise HTTPError(504, "El análisis de la imagen superó el tiempo límite")
+        except (ConnectionError, TimeoutError):
+            raise
+        except OSError:
+            # Pillow raises UnidentifiedImageError (an OSError) or plain OSError for data it can't decode
+            raise HTTPError(400, "No se pudo leer la imagen")
+        # Tell clients when the analysis was borrowed from a visually similar screenshot
+        distance = (timings or {}).get("near_duplicate_distance")
+        return {"analysis": analysis, "stats": stats, "timings": timings,
+                "near_duplicate": distance is not None, "near_duplicate_distance": distance}
+
+    def _run_image_analysis(self, image_bytes, api_key):
+        cache = self.analysis_cache or prompt_core.get_analysis_cache()
+        # persist=False keeps the service from writing to the process-wide stores, search index included
+        indexer = prompt_core.index_document if self.persist else None
+        return prompt_core.run_image_analysis(image_bytes, self.client_factory(api_key), cache, indexer=indexer,
+                                              near_duplicate_distance=self.near_duplicate_distance)
+
+    async def _health(self, body, headers):
+        return {"status": "ok"}
+
+    async def _metrics(self, body, headers):
+        return dict(self.counters, pending=self._pending, in_flight=len(self._in_flight))
+
+    async def _prometheus_metrics(self, body, headers):
+        lines = []
+        for name, value in self.counters.items():
+            lines.extend([
+                f"# TYPE prompt_service_{name}_total counter",
+                f"prompt_service_{name}_total {value}",
+            ])
+        lines.extend([
+            "# HELP prompt_service_pending Requests queued or running on the worker pool.",
+            "# TYPE prompt_service_pending gauge",
+            f"prompt_service_pending {self._pending}",
+        ])
+        return "\n".join(lines) + "\n" + metrics.to_prometheus()
+
+
+app = PromptService()
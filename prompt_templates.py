@@ -0,0 +1,103 @@
+import os
+import string
+import threading
+from collections import OrderedDict
+
+RENDER_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Template sources live outside the code so importing this module stays cheap
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+
+
+class PromptTemplate:
+    """str.format-style template parsed once into literal and placeholder segments
+
+    Pass either the source text or a path to read it from; either way it is parsed and its
+    placeholders validated on construction.
+    """
+
+    def __init__(self, name, source=None, fields=(), path=None):
+        if (source is None) == (path is None):
+            raise ValueError(f"Template '{name}': pass exactly one of source or path")
+        self.name = name
+        self.path = path
+        self.fields = frozenset(fields)
+        if path is not None:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                source = f.read()
+        self.source = source
+        self._parse(source)
+
+    def _parse(self, source):
+        parts, slots = [], []
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(source):
+            if literal:
+                parts.append(literal)
+            if field_name is None:
+                continue
+            if format_spec or conversion:
+                raise ValueError(f"Template '{self.name}': format specs are not supported in {{{field_name}}}")
+            slots.append((len(parts), field_name))
+            parts.append(None)
+
+        placeholders = {field_name for _, field_name in slots}
+        if placeholders != self.fields:
+            raise ValueError(
+                f"Template '{self.name}' placeholders {sorted(placeholders)} do not match {sorted(self.fields)}"
+            )
+        self._slots = slots
+        self._parts = parts
+
+    def render(self, **values):
+        """Fill the placeholders and assemble the output with a single join"""
+        parts = list(self._parts)
+        for index, field_name in self._slots:
+            parts[index] = str(values[field_name])
+        return "".join(parts)
+
+
+_render_cache = OrderedDict()
+_render_cache_bytes = 0
+_render_cache_lock = threading.Lock()
+
+
+def _render_key(template, values):
+    # Python caches str hashes, so keying on the values themselves hashes each input once
+    return (template.name,) + tuple(str(values[field_name]) for field_name in sorted(template.fields))
+
+
+def render_cached(template, **values):
+    """Render a template, reusing the output for inputs already seen (LRU by input hash)"""
+    global _render_cache_bytes
+    key = _render_key(template, values)
+    with _render_cache_lock:
+        rendered = _render_cache.get(key)
+        if rendered is not None:
+            _render_cache.move_to_end(key)
+            return rendered
+
+    rendered = template.render(**values)
+    size = len(rendered) + sum(len(value) for value in key[1:])
+    if size > RENDER_CACHE_MAX_BYTES:
+        return rendered
+    with _render_cache_lock:
+        if key not in _render_cache:
+            _render_cache[key] = rendered
+            _render_cache_bytes += size
+        while _render_cache_bytes > RENDER_CACHE_MAX_BYTES:
+            evicted_key, evicted = _render_cache.popitem(last=False)
+            _render_cache_bytes -= len(evicted) + sum(len(value) for value in evicted_key[1:])
+    return rendered
+
+
+def clear_render_cache():
+    """Drop all memoized renders"""
+    global _render_cache_bytes
+    with _render_cache_lock:
+        _render_cache.clear()
+        _render_cache_bytes = 0
+
+
+# Read and validated at import time, so a broken template fails on startup rather than on first use
+DEVELOPMENT_TEMPLATE = PromptTemplate("development", fields={"user_input"},
+                                      path=os.path.join(PROMPTS_DIR, "development.txt"))
+DEBUG_TEMPLATE = PromptTemplate("debug", fields={"user_input"}, path=os.path.join(PROMPTS_DIR, "debug.txt"))
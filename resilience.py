@@ -0,0 +1,153 @@
+"""Deadlines, jittered retries and a circuit breaker for calls to remote APIs."""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 8.0
+CALL_DEADLINE_SECONDS = 120
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+# Threads for calls whose client offers no timeout of its own
+DEADLINE_WORKERS = 16
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CallDeadlineExceeded(TimeoutError):
+    """Raised when a call (including its retries) runs past its deadline"""
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by an overall deadline"""
+
+    def __init__(self, retryable, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY_SECONDS,
+                 max_delay=RETRY_MAX_DELAY_SECONDS, deadline=CALL_DEADLINE_SECONDS, seed=None):
+        self.retryable = tuple(retryable)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._random = random.Random(seed)
+
+    def backoff(self, attempt):
+        """Delay before retry number `attempt` (1-based)"""
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single trial call through once it cools down"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.short_circuited = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_seconds - time.monotonic()
+                if remaining > 0:
+                    self.short_circuited += 1
+                    raise CircuitOpenError("La API de Gemini no está disponible temporalmente", remaining)
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.short_circuited += 1
+                    raise CircuitOpenError("La API de Gemini se está recuperando", self.reset_seconds)
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """End a call whose error says nothing about the API's health (e.g. a bad request)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures,
+                    "short_circuited": self.short_circuited}
+
+
+_deadline_executor = None
+_deadline_executor_lock = threading.Lock()
+
+
+def run_with_timeout(func, timeout, *args, **kwargs):
+    """Run func on a helper thread and stop waiting after timeout seconds
+
+    The call itself can't be interrupted; it finishes in the background and its result
+    is dropped, but the caller is never blocked past the deadline.
+    """
+    global _deadline_executor
+    with _deadline_executor_lock:
+        if _deadline_executor is None:
+            _deadline_executor = ThreadPoolExecutor(max_workers=DEADLINE_WORKERS,
+                                                    thread_name_prefix="deadline")
+    future = _deadline_executor.submit(func, *args, **kwargs)
+    try:
+        return future.result(timeout=max(0, timeout))
+    except FuturesTimeoutError:
+        future.cancel()
+        raise CallDeadlineExceeded(f"Sin respuesta tras {timeout:.1f} s")
+
+
+def call_with_retry(attempt_call, policy, breaker, on_retry=None, deadline=None):
+    """Call attempt_call(remaining_seconds) until it succeeds, fails permanently or runs out of time
+
+    Returns (result, attempts). Only errors in policy.retryable (and deadline overruns) are
+    retried and count against the breaker.
+    """
+    deadline_at = time.monotonic() + (deadline if deadline is not None else policy.deadline)
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise CallDeadlineExceeded(f"Plazo agotado tras {attempt - 1} intento(s)")
+        breaker.before_call()
+        try:
+            result = attempt_call(remaining)
+        except policy.retryable + (CallDeadlineExceeded,) as e:
+            breaker.record_failure()
+            delay = policy.backoff(attempt)
+            if attempt >= policy.max_attempts or time.monotonic() + delay >= deadline_at:
+                raise
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            time.sleep(delay)
+            continue
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result, attempt
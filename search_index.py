@@ -0,0 +1,151 @@
+"""Full-text search over stored plans, debug plans and image analyses (SQLite FTS5)."""
+import os
+import re
+import time
+
+from plan_store import PLANS_DIR
+from storage_utils import SQLiteConnections
+
+SEARCH_DB_PATH = os.path.join(PLANS_DIR, "search.db")
+SEARCH_RESULTS_LIMIT = 20
+# Snippet length in tokens around the best match
+SEARCH_SNIPPET_TOKENS = 16
+# Title matches count this many times more than body matches
+SEARCH_TITLE_WEIGHT = 5.0
+# Only the newest matches are ranked, so very common terms don't cost a scan of the whole history
+SEARCH_CANDIDATES = 2000
+# Shorter last words are matched exactly; a one- or two-letter prefix expands to most of the vocabulary
+SEARCH_PREFIX_MIN_CHARS = 3
+
+QUERY_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    terms = QUERY_TERM_PATTERN.findall(text)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= SEARCH_PREFIX_MIN_CHARS:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+class SearchHit:
+    """One ranked search result"""
+
+    def __init__(self, doc_id, kind, title, snippet, created_at, score):
+        self.doc_id = doc_id
+        self.kind = kind
+        self.title = title
+        self.snippet = snippet
+        self.created_at = created_at
+        self.score = score
+
+
+class SearchIndex:
+    """Inverted index of documents keyed by ID; re-adding an ID replaces the earlier version"""
+
+    def __init__(self, path=SEARCH_DB_PATH):
+        self.path = path
+        self._connections = SQLiteConnections(path)
+
+        conn = self._connection()
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    rowid INTEGER PRIMARY KEY,
+                    doc_id TEXT NOT NULL UNIQUE,
+                    kind TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_documents_kind ON documents (kind, created_at);
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+                    title, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '3'
+                );
+            """)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def add(self, doc_id, kind, title, body, created_at=None):
+        """Index (or re-index) one document"""
+        self.add_many([(doc_id, kind, title, body, created_at)])
+
+    def add_many(self, documents):
+        """Index (doc_id, kind, title, body, created_at) tuples in a single transaction"""
+        conn = self._connection()
+        with conn:
+            for doc_id, kind, title, body, created_at in documents:
+                row = conn.execute("SELECT rowid FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM documents_fts WHERE rowid = ?", row)
+                    conn.execute("DELETE FROM documents WHERE rowid = ?", row)
+                rowid = conn.execute(
+                    "INSERT INTO documents (doc_id, kind, created_at) VALUES (?, ?, ?)",
+                    (doc_id, kind, created_at if created_at is not None else time.time()),
+                ).lastrowid
+                conn.execute("INSERT INTO documents_fts (rowid, title, body) VALUES (?, ?, ?)",
+                             (rowid, title, body))
+
+    def remove(self, doc_id):
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT rowid FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM documents_fts WHERE rowid = ?", row)
+                conn.execute("DELETE FROM documents WHERE rowid = ?", row)
+
+    def search(self, text, kind=None, limit=SEARCH_RESULTS_LIMIT, candidates=SEARCH_CANDIDATES):
+        """Return SearchHits for free text, best matches first
+
+        Ranking is limited to the newest `candidates` matches: FTS5 walks rowids newest first
+        and stops there, so latency stays flat as the history grows.
+        """
+        match = build_match_query(text)
+        if match is None:
+            return []
+        query = (
+            f"SELECT f.rowid, bm25(documents_fts, {SEARCH_TITLE_WEIGHT}, 1.0) AS score "
+            "FROM documents_fts f JOIN documents d ON d.rowid = f.rowid "
+            "WHERE documents_fts MATCH ?"
+        )
+        params = [match]
+        if kind is not None:
+            query += " AND d.kind = ?"
+            params.append(kind)
+        query = f"SELECT rowid, score FROM ({query} ORDER BY f.rowid DESC LIMIT ?) ORDER BY score LIMIT ?"
+        params.extend([candidates, limit])
+        conn = self._connection()
+        ranked = conn.execute(query, params).fetchall()
+        if not ranked:
+            return []
+
+        # Snippets are costly, so only build them for the hits actually returned
+        placeholders = ", ".join("?" * len(ranked))
+        rows = conn.execute(
+            "SELECT f.rowid, d.doc_id, d.kind, f.title, "
+            f"snippet(documents_fts, 1, '**', '**', '…', {SEARCH_SNIPPET_TOKENS}), d.created_at "
+            "FROM documents_fts f JOIN documents d ON d.rowid = f.rowid "
+            f"WHERE documents_fts MATCH ? AND f.rowid IN ({placeholders})",
+            [match] + [rowid for rowid, _ in ranked],
+        ).fetchall()
+        details = {row[0]: row[1:] for row in rows}
+        return [SearchHit(*details[rowid], score) for rowid, score in ranked if rowid in details]
+
+    def get(self, doc_id):
+        """Return (kind, title, body) of an indexed document, or None"""
+        return self._connection().execute(
+            "SELECT d.kind, f.title, f.body FROM documents d JOIN documents_fts f ON f.rowid = d.rowid "
+            "WHERE d.doc_id = ?", (doc_id,),
+        ).fetchone()
+
+    def optimize(self):
+        """Merge the index's b-tree segments; worth running after large bulk loads"""
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+    def stats(self):
+        count = self._connection().execute("SELECT count(*) FROM documents").fetchone()[0]
+        return {"documents": count}
@@ -0,0 +1,92 @@
+import sys
+import threading
+from collections import OrderedDict
+
+SESSION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+SESSION_CACHE_MAX_ENTRIES_PER_SESSION = 32
+
+
+def estimate_size(value):
+    """Rough in-memory size of a result: strings, bytes, containers and plain objects"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items()) + 64
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(estimate_size(item) for item in value) + 64
+    if hasattr(value, "__dict__"):
+        return estimate_size(vars(value)) + 64
+    return sys.getsizeof(value)
+
+
+class SessionResultCache:
+    """Results keyed by session, with LRU eviction across all sessions under one byte budget"""
+
+    def __init__(self, max_bytes=SESSION_CACHE_MAX_BYTES,
+                 max_entries_per_session=SESSION_CACHE_MAX_ENTRIES_PER_SESSION):
+        self.max_bytes = max_bytes
+        self.max_entries_per_session = max_entries_per_session
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sessions = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id, key):
+        """Return the stored result for key in this session, or None"""
+        with self._lock:
+            entry = self._entries.get((session_id, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((session_id, key))
+            self._sessions[session_id].move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, session_id, key, value, size=None):
+        """Store a result, evicting this session's oldest and then the globally oldest entries"""
+        size = estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove((session_id, key))
+            self._entries[(session_id, key)] = (value, size)
+            self._sessions.setdefault(session_id, OrderedDict())[key] = None
+            self._bytes += size
+            session_keys = self._sessions[session_id]
+            while len(session_keys) > self.max_entries_per_session:
+                self._remove((session_id, next(iter(session_keys))))
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def drop_session(self, session_id):
+        """Forget every result stored for a session"""
+        with self._lock:
+            for key in list(self._sessions.get(session_id, ())):
+                self._remove((session_id, key))
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        session_id, key = entry_key
+        session_keys = self._sessions[session_id]
+        del session_keys[key]
+        if not session_keys:
+            del self._sessions[session_id]
+
+    def stats(self):
+        """Return entry, session and byte counts plus hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
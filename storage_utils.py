@@ -0,0 +1,70 @@
+"""Shared plumbing for the on-disk stores: per-thread SQLite connections and a background write queue."""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+
+
+class SQLiteConnections:
+    """One WAL-mode connection per thread to a single database file
+
+    sqlite3 connections can't be shared across threads. setup_pragmas run on each new
+    connection before the switch to WAL, which matters for settings such as auto_vacuum that
+    only take effect on a fresh database.
+    """
+
+    def __init__(self, path, setup_pragmas=()):
+        self.path = path
+        self.setup_pragmas = tuple(setup_pragmas)
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+            for pragma in self.setup_pragmas:
+                conn.execute(f"PRAGMA {pragma}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class BackgroundWriter:
+    """Single daemon thread that drains queued writes so callers never wait on disk"""
+
+    def __init__(self, max_pending=1024, name="background-writer"):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """Queue func(*args); blocks only if max_pending writes are already waiting"""
+        self._queue.put((func, args))
+
+    def flush(self):
+        """Block until every queued write has been attempted"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+                self.written += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Background write failed")
+            finally:
+                self._queue.task_done()
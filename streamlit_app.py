@@ -1,9 +1,30 @@
-import streamlit as st
-import os
-import json
+import hashlib
+import time
+import uuid
 from datetime import datetime
-import google.generativeai as genai
-from tempfile import NamedTemporaryFile
+
+import streamlit as st
+from gemini_client import get_gemini_client
+from log_ingest import LOG_BUDGET_BYTES, STACK_TRACE_BUDGET_BYTES, ingest_log
+from prompt_core import (
+    DEBUG_TEMPLATE,
+    DEVELOPMENT_TEMPLATE,
+    IMAGE_NEAR_DUPLICATE_MAX_DISTANCE,
+    IMAGE_NEAR_DUPLICATE_SUGGESTED_DISTANCE,
+    PromptGenerationError,
+    analyze_error_images,
+    generate_prompt,
+    get_analysis_cache,
+    find_similar_incidents,
+    get_plan_deduplicator,
+    get_plan_store,
+    get_search_index,
+    merge_image_analyses,
+    record_incident,
+)
+from plan_store import fingerprint_input
+from session_cache import SessionResultCache
+from tracing import configure_json_logging, span, start_trace
 
 # Configure Streamlit page
 st.set_page_config(
@@ -12,57 +33,146 @@ st.set_page_config(
     layout="wide"
 )
 
+# Prompts longer than this are shown one page at a time, without syntax highlighting
+PROMPT_VIEWER_PAGE_CHARS = 20_000
+TRACE_BAR_WIDTH = 40
+SEARCH_KINDS = {
+    "Todo": None,
+    "Planes y prompts": "plan",
+    "Planes de depuración": "debug_plan",
+    "Análisis de imágenes": "image_analysis",
+}
+SEARCH_KIND_ICONS = {"plan": "🗂️", "debug_plan": "🐛", "image_analysis": "🖼️"}
+INCIDENT_PREVIEW_CHARS = 600
+NEAR_DUPLICATE_MAX_SLIDER = 48
+
+# Structured JSON trace logs on stderr
+configure_json_logging()
+
 # Initialize session state for API key
 if 'gemini_api_key' not in st.session_state:
     st.session_state.gemini_api_key = None
 
+# Results live in a shared, bounded cache; the session only keeps their keys
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# cache_resource, not lru_cache: this script is re-executed on every rerun
+@st.cache_resource
+def get_session_results():
+    """Return the process-wide cache of per-session results"""
+    return SessionResultCache()
+
+def content_digest(source):
+    """Hash pasted text or an uploaded file's bytes without copying the upload"""
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    elif hasattr(source, "getbuffer"):
+        source = source.getbuffer()
+    return hashlib.sha256(source).hexdigest()
+
+def cached_log_digest(source, budget_bytes):
+    """Condense a log once per session; reruns reuse the stored digest"""
+    key = ("log", budget_bytes, content_digest(source or ""))
+    results = get_session_results()
+    digest = results.get(st.session_state.session_id, key)
+    if digest is None:
+        with span("log.ingest") as ingest:
+            digest = ingest_log(source or "", budget_bytes=budget_bytes)
+            ingest.set(bytes=digest.input_bytes, output_bytes=len(digest.text))
+        results.put(st.session_state.session_id, key, digest, size=len(digest.text))
+    return digest
+
 def configure_gemini_api(api_key):
-    """Configure Gemini API with the provided key"""
+    """Build (or reuse) the pooled Gemini client for the provided key"""
     try:
-        genai.configure(api_key=api_key)
+        get_gemini_client(api_key)
         return True
     except Exception as e:
         st.error(f"Error configurando la API de Gemini: {str(e)}")
         return False
 
-def analyze_error_image(image_file):
-    """Analyze error image using Gemini API"""
-    try:
-        # Create temporary file to handle StreamlitUploadedFile
-        with NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
-            tmp_file.write(image_file.getvalue())
-            tmp_path = tmp_file.name
-
-        # Configure Gemini model
-        generation_config = {
-            "temperature": 1,
-            "top_p": 0.95,
-            "top_k": 64,
-            "max_output_tokens": 8192,
-        }
-
-        model = genai.GenerativeModel(
-            model_name="gemini-exp-1121",
-            generation_config=generation_config,
-        )
-
-        # Upload and analyze image
-        image = genai.upload_file(tmp_path, mime_type="image/png")
-        
-        chat = model.start_chat()
-        response = chat.send_message([
-            image,
-            "Analiza esta imagen de error y proporciona una descripción detallada del problema que muestra. " +
-            "Incluye cualquier mensaje de error, stack trace o información relevante que observes."
-        ])
-
-        # Clean up temporary file
-        os.unlink(tmp_path)
-        
-        return response.text
-    except Exception as e:
-        st.error(f"Error analizando la imagen: {str(e)}")
-        return None
+def show_image_analysis_results(results):
+    """Report preprocessing stats and failures for each analyzed image"""
+    for result in results:
+        stats = result["stats"]
+        timings = result["timings"]
+        if result["error"]:
+            st.error(f"Error analizando la imagen {result['name']}: {result['error']}")
+        elif stats:
+            st.caption(
+                f"{result['name']}: {stats['source_format']} {stats['original_bytes'] / 1024:.0f} KB "
+                f"({stats['original_dimensions'][0]}x{stats['original_dimensions'][1]}) → "
+                f"{stats['mime_type']} {stats['final_bytes'] / 1024:.0f} KB "
+                f"({stats['dimensions'][0]}x{stats['dimensions'][1]}) · "
+                f"primer token {timings['time_to_first_token'] or 0:.1f} s, total {timings['total'] or 0:.1f} s"
+            )
+        elif timings and timings.get("near_duplicate_distance") is not None:
+            st.caption(
+                f"{result['name']}: análisis reutilizado de una captura casi idéntica "
+                f"({timings['near_duplicate_distance']} bits de diferencia en el hash perceptual)"
+            )
+        else:
+            st.caption(f"{result['name']}: análisis recuperado de la caché")
+
+def show_log_digest(label, digest):
+    """Summarize how much of a log made it into the prompt"""
+    stats = digest.stats()
+    st.caption(
+        f"{label}: {stats['input_lines']} líneas ({stats['input_bytes'] / 1024:.0f} KB) → "
+        f"{stats['output_bytes'] / 1024:.0f} KB · {stats['collapsed_lines']} repeticiones agrupadas · "
+        f"{stats['error_regions']} regiones de error"
+    )
+
+def show_size_report(size_report):
+    """Show the estimated prompt size and which sections had to be shortened"""
+    if size_report is None:
+        return
+    st.caption(
+        f"📏 Tamaño estimado: {size_report['total_tokens']:,} / {size_report['budget_tokens']:,} tokens "
+        f"(sin recortar: {size_report['original_tokens']:,} tokens)"
+    )
+    if size_report["over_budget"]:
+        st.warning("⚠️ El prompt supera el presupuesto de tokens incluso tras recortar las secciones.")
+    compressed = [section for section in size_report["sections"] if section["compressed"]]
+    if compressed:
+        with st.expander("✂️ Secciones recortadas para ajustarse al presupuesto"):
+            for section in compressed:
+                st.write(f"**{section['name']}**: {section['original_tokens']:,} → {section['tokens']:,} tokens")
+
+def page_offsets(text, page_chars=PROMPT_VIEWER_PAGE_CHARS):
+    """Split text into pages of about page_chars, breaking at line ends where possible"""
+    offsets, start = [], 0
+    while start < len(text):
+        end = min(start + page_chars, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        offsets.append((start, end))
+        start = end
+    return offsets
+
+def show_prompt(prompt, key):
+    """Show a prompt, paging large ones so only the visible part is sent and rendered"""
+    st.download_button(
+        "⬇️ Descargar prompt completo",
+        data=prompt.encode("utf-8"),
+        file_name=f"prompt_{key}.md",
+        mime="text/markdown",
+        key=f"{key}_download",
+    )
+    if len(prompt) <= PROMPT_VIEWER_PAGE_CHARS:
+        st.code(prompt, language="markdown")
+        return
+
+    offsets = page_offsets(prompt)
+    page = st.number_input(
+        f"Página (de {len(offsets)})", min_value=1, max_value=len(offsets), value=1, key=f"{key}_page"
+    )
+    start, end = offsets[page - 1]
+    st.caption(f"Caracteres {start + 1:,}–{end:,} de {len(prompt):,}")
+    st.code(prompt[start:end], language=None)
 
 # Custom CSS
 st.markdown("""
@@ -85,622 +195,146 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Base prompts
-development_prompt = """Eres Cascade, un asistente de IA experto y desarrollador de software senior creado por el equipo de ingeniería de Codeium. Tu objetivo es ayudar a los usuarios a convertir sus ideas en código funcional y eficiente. 
-
-⚠️ RESTRICCIÓN IMPORTANTE ⚠️
-ANTES de realizar CUALQUIER acción o generar CUALQUIER código, DEBES:
-
-1. ANÁLISIS INICIAL:
-   - Analiza meticulosamente el requerimiento del usuario
-   - Identifica el objetivo principal y los sub-objetivos
-   - Define el alcance del proyecto
-   - Lista todas las funcionalidades requeridas
-
-2. PLANIFICACIÓN DETALLADA:
-   Crea un archivo 'development_plan.md' que DEBE incluir:
-
-   A. VISIÓN GENERAL
-      - Objetivo principal
-      - Alcance del proyecto
-      - Resultados esperados
-      - Restricciones identificadas
-
-   B. ESTRUCTURA DE VALIDACIÓN OBLIGATORIA
-      Cada paso DEBE seguir esta jerarquía:
-
-      1. PASO PRINCIPAL
-         1.1. OBJETIVO ESPECÍFICO
-              □ ¿Qué se busca lograr exactamente?
-              □ ¿Cuál es el resultado esperado?
-              □ ¿Cómo se medirá el éxito?
-
-         1.2. PREREQUISITOS
-              □ Dependencias necesarias
-              □ Estado inicial requerido
-              □ Recursos necesarios
-
-         1.3. SUB-PASOS
-              1.3.1. Sub-paso 1
-                    - Input específico
-                    - Proceso detallado
-                    - Output esperado
-                    - Validación requerida
-
-              1.3.2. Sub-paso 2
-                    [Mismo formato...]
-
-         1.4. VALIDACIÓN DE COMPLETITUD
-              □ Checklist de resultados esperados
-              □ Pruebas específicas
-              □ Criterios de aceptación
-
-   C. FRAMEWORK DE DEPENDENCIAS
-      Cada acción DEBE especificar:
-
-      1. ESTADO INICIAL
-         □ Variables requeridas: [lista]
-         □ Configuraciones necesarias: [lista]
-         □ Precondiciones: [lista]
-
-      2. TRANSFORMACIÓN
-         2.1. Entrada
-             - Formato específico
-             - Validaciones requeridas
-             - Restricciones
-
-         2.2. Proceso
-             - Pasos atómicos
-             - Puntos de verificación
-             - Manejo de errores
-
-         2.3. Salida
-             - Formato esperado
-             - Validaciones post-proceso
-             - Estado final garantizado
-
-      3. VERIFICACIÓN
-         □ Tests unitarios específicos
-         □ Casos edge a probar
-         □ Criterios de éxito medibles
-
-   D. ARQUITECTURA Y DISEÑO
-      - Patrones de diseño a utilizar
-      - Estructura de archivos propuesta
-      - Componentes principales
-      - Interacciones entre componentes
-
-   E. MÓDULOS DEL SISTEMA
-      Para cada módulo identificado:
-      1. Propósito y responsabilidades
-      2. Dependencias y relaciones
-      3. Interfaces públicas
-      4. Estructuras de datos clave
-      5. Consideraciones de rendimiento
-
-   F. PLAN DE IMPLEMENTACIÓN
-      Para cada componente:
-      1. Preparación
-         - Configuración del entorno
-         - Dependencias necesarias
-         - Herramientas requeridas
-
-      2. Desarrollo
-         2.1 Fundamentos
-             - Estructuras base
-             - Configuraciones iniciales
-             - Setup del proyecto
-
-         2.2 Componentes Core
-             - Lista priorizada de componentes
-             - Dependencias entre componentes
-             - Orden de implementación
-
-         2.3 Funcionalidades
-             - Desglose de cada función
-             - Inputs y outputs esperados
-             - Validaciones necesarias
-
-         2.4 Integración
-             - Puntos de integración
-             - Pruebas de integración
-             - Manejo de errores
-
-      3. Validación
-         - Casos de prueba
-         - Criterios de aceptación
-         - Métricas de calidad
-
-   G. CONSIDERACIONES TÉCNICAS
-      1. Seguridad
-         - Autenticación
-         - Autorización
-         - Protección de datos
-
-      2. Rendimiento
-         - Optimizaciones necesarias
-         - Puntos de mejora
-         - Benchmarks esperados
-
-      3. Mantenibilidad
-         - Estándares de código
-         - Documentación requerida
-         - Prácticas de logging
-
-   H. PLAN DE PRUEBAS
-      1. Unitarias
-         - Componentes a probar
-         - Casos de prueba
-         - Herramientas necesarias
-
-      2. Integración
-         - Flujos completos
-         - Escenarios edge-case
-         - Manejo de errores
-
-      3. Sistema
-         - Pruebas end-to-end
-         - Pruebas de carga
-         - Validación de requerimientos
-
-   I. SISTEMA DE LOGGING
-      1. Estructura del Log
-         - Timestamp
-         - Nivel de log (INFO, WARNING, ERROR, DEBUG)
-         - Módulo/Función
-         - Mensaje detallado
-         - Stack trace (si aplica)
-         - Estado del sistema
-         - Datos relevantes
-
-      2. Categorías de Log
-         2.1 Errores de Usuario
-             - Inputs inválidos
-             - Acciones no permitidas
-             - Problemas de permisos
-
-         2.2 Errores del Sistema
-             - Excepciones no manejadas
-             - Problemas de recursos
-             - Fallos de integración
-
-         2.3 Eventos de Negocio
-             - Acciones importantes
-             - Cambios de estado
-             - Decisiones del sistema
-
-         2.4 Métricas de Rendimiento
-             - Tiempos de respuesta
-             - Uso de recursos
-             - Patrones de uso
-
-      3. Almacenamiento y Rotación
-         - Política de retención
-         - Rotación de archivos
-         - Compresión y archivo
-
-      4. Análisis y Monitoreo
-         - Herramientas de análisis
-         - Alertas y notificaciones
-         - Dashboard de monitoreo
-
-   J. PROPUESTAS DE IMPLEMENTACIÓN
-      Para cada aspecto clave del sistema, se presentarán múltiples propuestas:
-
-      1. Formato de Propuesta
-         A) Título de la Propuesta
-         B) Descripción detallada
-         C) Ventajas y desventajas
-         D) Complejidad de implementación
-         E) Recursos necesarios
-         F) Tiempo estimado
-         G) Riesgos potenciales
-
-      2. Ejemplo de Estructura
-         PROPUESTA 1: [Título]
-         A) [Descripción de la implementación]
-         B) Ventajas:
-            - [Lista de ventajas]
-         C) Desventajas:
-            - [Lista de desventajas]
-         D) Recursos:
-            - [Recursos necesarios]
-         E) Tiempo: [Estimación]
-         F) Riesgos: [Lista de riesgos]
-
-         PROPUESTA 2: [Título alternativo]
-         [Mismo formato...]
-
-      3. Proceso de Selección
-         - Presentar todas las propuestas
-         - Esperar selección del usuario
-         - Documentar decisión y razones
-         - Proceder con la implementación elegida
-
-⚠️ ESPERA CONFIRMACIÓN antes de proceder con la implementación
-
-Input del usuario: {user_input}
-
-<estructura_proyecto>
-<proyecto id="id_proyecto" titulo="Título del Proyecto">
-  <modulo id="id_modulo_1" titulo="Nombre del Módulo">
-    <componente id="id_componente_1" titulo="Nombre del Componente">
-      <tarea id="id_tarea_1" titulo="Nombre de la Tarea">
-        <paso id="id_paso_1" titulo="Descripción del Paso">
-          <sub_paso id="id_sub_paso_1">Detalle del sub-paso</sub_paso>
-          <validacion>Criterios de validación</validacion>
-          <dependencias>Lista de dependencias</dependencias>
-        </paso>
-      </tarea>
-    </componente>
-  </modulo>
-</proyecto>
-</estructura_proyecto>
-
-<mejores_practicas>
-- SIEMPRE desglosar cada módulo en componentes manejables
-- Identificar y documentar todas las dependencias
-- Establecer criterios de validación claros
-- Considerar la escalabilidad desde el inicio
-- Mantener la cohesión alta y el acoplamiento bajo
-- Documentar decisiones de diseño importantes
-- Priorizar la mantenibilidad y legibilidad
-- Implementar logging y manejo de errores robusto
-- Mantener logs detallados y organizados
-- Documentar decisiones y alternativas consideradas
-- Facilitar el análisis posterior de errores
-- Implementar sistema de propuestas claro
-</mejores_practicas>
-
-<formato_codigo>
-- Usar markdown para documentación
-- Seguir convenciones de nombrado consistentes
-- Mantener funciones pequeñas y enfocadas
-- Documentar interfaces públicas
-- Incluir tipos y validaciones
-- Manejar errores apropiadamente
-- Incluir logging en puntos críticos
-- Documentar decisiones de diseño
-</formato_codigo>
-
-<sistema_logging>
-ESTRUCTURA DE LOG:
-1. METADATA
-   - Timestamp: YYYY-MM-DD HH:mm:ss.SSS
-   - Level: INFO|WARNING|ERROR|DEBUG
-   - Module: nombre_modulo
-   - Function: nombre_funcion
-
-2. CONTENIDO
-   - Message: descripcion_detallada
-   - Stack Trace: si_aplica
-
-3. CONTEXTO
-   - User Input: datos_relevantes
-   - System State: estado_actual
-   - Performance Metrics: metricas_relevantes
-</sistema_logging>
-
-<formato_propuestas>
-ESTRUCTURA DE PROPUESTA:
-1. IDENTIFICACIÓN
-   - ID: identificador_unico
-   - Título: nombre_descriptivo
-   - Descripción: detalle_completo
-
-2. ANÁLISIS
-   - Ventajas:
-     □ [Lista de ventajas]
-   - Desventajas:
-     □ [Lista de desventajas]
-
-3. RECURSOS Y TIEMPO
-   - Recursos necesarios:
-     □ [Lista de recursos]
-   - Tiempo estimado: [estimacion]
-   - Riesgos potenciales:
-     □ [Lista de riesgos]
-
-4. ESTADO
-   - Estado actual: [pendiente|aprobada|rechazada]
-   - Razones de decisión: [explicacion]
-</formato_propuestas>
-
-"""
-
-# Debug prompt
-debug_prompt = """Eres Cascade, un experto debugger y desarrollador de software senior creado por el equipo de ingeniería de Codeium. Tu objetivo es ayudar a los usuarios a identificar, analizar y resolver bugs de manera sistemática y efectiva.
-
-⚠️ RESTRICCIÓN IMPORTANTE ⚠️
-ANTES de realizar CUALQUIER acción o modificar CUALQUIER código, DEBES:
-1. Crear un archivo 'debug_plan.md' con el análisis y plan de depuración
-2. Esperar confirmación del usuario de que el enfoque es correcto
-3. Solo proceder con las modificaciones después de la aprobación
-
-FLUJO DE TRABAJO OBLIGATORIO:
-
-1. ANÁLISIS Y DIAGNÓSTICO INICIAL:
-   a) Analiza el reporte de error y contexto proporcionado
-   b) Crea 'debug_plan.md' con:
-      - Descripción detallada del problema
-      - Análisis de posibles causas
-      - Plan de diagnóstico paso a paso
-      - Estrategia de pruebas
-      - Potenciales riesgos y consideraciones
-   c) Presenta el plan al usuario y espera aprobación
-   d) NO procedas sin confirmación explícita
-
-2. PROCESO DE DEPURACIÓN (Solo después de aprobación):
-   - Sigue el plan de diagnóstico aprobado
-   - Documenta cada hallazgo
-   - Verifica hipótesis sistemáticamente
-   - Identifica la causa raíz
-
-3. IMPLEMENTACIÓN DE SOLUCIÓN (Solo después de confirmación):
-   - Propone correcciones específicas
-   - Implementa cambios de manera incremental
-   - Verifica que no se introduzcan nuevos problemas
-   - Valida la solución
-
-Error reportado: {user_input}
-
-<herramientas_debugging>
-- Análisis de stack traces
-- Logging y diagnóstico
-- Inspección de código
-- Pruebas unitarias
-- Verificación de dependencias
-- Análisis de configuración
-</herramientas_debugging>
-
-<formato_debug_plan>
-# Plan de Depuración: [Descripción Breve del Error]
-
-## 1. Análisis del Problema
-- Descripción del error
-- Comportamiento esperado vs actual
-- Contexto y condiciones de reproducción
-
-## 2. Diagnóstico Inicial
-- Posibles causas
-- Áreas de código afectadas
-- Dependencias relacionadas
-
-## 3. Plan de Investigación
-1. [Paso de diagnóstico 1]
-2. [Paso de diagnóstico 2]
-...
-
-## 4. Estrategia de Pruebas
-- Casos de prueba específicos
-- Métodos de validación
-- Criterios de éxito
-
-## 5. Consideraciones de Riesgo
-- Impacto potencial
-- Áreas que requieren precaución
-- Plan de rollback si es necesario
-
-⚠️ Por favor, revisa y aprueba este plan antes de proceder con la depuración.
-</formato_debug_plan>
-
-<mejores_practicas_debug>
-- SIEMPRE crear y obtener aprobación del plan antes de cualquier modificación
-- Documentar todos los cambios y hallazgos
-- Verificar efectos secundarios
-- Mantener respaldos del código original
-- Validar la solución en un entorno controlado
-</mejores_practicas_debug>
-"""
-
-# Add new constants for plan management
-PLANS_DIR = "project_plans"
-PLAN_VALIDATION_RULES = {
-    "required_sections": [
-        "analysis",
-        "components",
-        "implementation_steps",
-        "technical_considerations",
-        "testing"
-    ]
-}
+def run_prompt_generation(user_input, template=DEVELOPMENT_TEMPLATE):
+    """Generate a prompt (or reuse this session's) and report the outcome; returns its result key"""
+    key = ("prompt", template.name, fingerprint_input(user_input))
+    results = get_session_results()
+    with span("session.lookup") as lookup:
+        result = results.get(st.session_state.session_id, key)
+        lookup.set(cache_hit=result is not None)
+    if result is not None:
+        st.info("♻️ Prompt recuperado de esta sesión")
+        show_size_report(result.size_report)
+        return key
 
-def ensure_plans_directory():
-    """Ensure the plans directory exists"""
-    if not os.path.exists(PLANS_DIR):
-        os.makedirs(PLANS_DIR)
-
-def create_plan_file(user_input, plan_content):
-    """Create and save a plan file"""
-    ensure_plans_directory()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    plan_filename = f"plan_{timestamp}.json"
-    plan_path = os.path.join(PLANS_DIR, plan_filename)
-    
-    plan_data = {
-        "user_input": user_input,
-        "timestamp": timestamp,
-        "plan": {
-            "analysis": plan_content.get("analysis", []),
-            "components": plan_content.get("components", []),
-            "implementation_steps": plan_content.get("implementation_steps", []),
-            "technical_considerations": plan_content.get("technical_considerations", []),
-            "testing": plan_content.get("testing", [])
-        },
-        "status": "pending_validation"
-    }
-    
-    with open(plan_path, 'w', encoding='utf-8') as f:
-        json.dump(plan_data, f, indent=2, ensure_ascii=False)
-    
-    return plan_path
-
-def validate_plan(plan_path):
-    """Validate that the plan meets all requirements"""
     try:
-        with open(plan_path, 'r', encoding='utf-8') as f:
-            plan_data = json.load(f)
-        
-        # Check for required sections
-        for section in PLAN_VALIDATION_RULES["required_sections"]:
-            if section not in plan_data["plan"] or not plan_data["plan"][section]:
-                return False, f"Missing or empty required section: {section}"
-        
-        # Update plan status to validated
-        plan_data["status"] = "validated"
-        with open(plan_path, 'w', encoding='utf-8') as f:
-            json.dump(plan_data, f, indent=2, ensure_ascii=False)
-        
-        return True, "Plan validation successful"
-    except Exception as e:
-        return False, f"Plan validation failed: {str(e)}"
-
-def generate_plan(user_input):
-    """Generate a detailed plan based on user input."""
-    plan_content = {
-        "analysis": [
-            "Analyzing user requirements...",
-            "Identifying key components...",
-            "Determining technical constraints..."
-        ],
-        "components": [
-            "List required components...",
-            "Define component interactions...",
-            "Specify dependencies..."
-        ],
-        "implementation_steps": [
-            "Break down implementation steps...",
-            "Define order of operations...",
-            "Identify potential challenges..."
-        ],
-        "technical_considerations": [
-            "Performance requirements...",
-            "Security considerations...",
-            "Scalability factors..."
-        ],
-        "testing": [
-            "Unit testing strategy...",
-            "Integration testing approach...",
-            "Validation criteria..."
-        ]
-    }
-    
-    # Create and save the plan file
-    plan_path = create_plan_file(user_input, plan_content)
-    
-    # Validate the plan
-    is_valid, message = validate_plan(plan_path)
-    if not is_valid:
-        raise ValueError(f"Plan validation failed: {message}")
-    
-    return plan_content
-
-def generate_xml_structure(plan):
-    """Convert the plan into XML project structure."""
-    xml_prompt = f"""Convierte el siguiente plan en un proyecto XML estructurado:
-
-{str(plan)}
-
-Utiliza la estructura:
-<proyecto id="..." titulo="...">
-  <tarea id="..." titulo="...">
-    <subtarea id="..." titulo="...">
-      Descripción detallada...
-    </subtarea>
-  </tarea>
-</proyecto>"""
-    
-    return xml_prompt
-
-def generate_prompt(user_input):
-    try:
-        # Sanitize user input
-        user_input = user_input.strip()
-        if not user_input:
-            raise ValueError("El input del usuario no puede estar vacío")
-        
-        # Generate and validate plan first
-        try:
-            plan_content = generate_plan(user_input)
-            st.success("✅ Plan generated and validated successfully!")
-        except Exception as e:
-            st.error(f"❌ Failed to generate or validate plan: {str(e)}")
-            return None
-        
-        # Generate XML structure only if plan is valid
-        try:
-            xml_structure = generate_xml_structure(plan_content)
-        except Exception as e:
-            st.error(f"❌ Failed to generate XML structure: {str(e)}")
-            return None
-        
-        # Combine everything into the final prompt
-        try:
-            # Construir el prompt por partes para mejor control de errores
-            prompt_parts = []
-            
-            # Parte 1: Development prompt base
-            prompt_parts.append(development_prompt.format(user_input=user_input))
-            
-            # Parte 2: Plan detallado
-            prompt_parts.append("\n\nPLAN DETALLADO:")
-            prompt_parts.append(str(plan_content).strip())
-            
-            # Parte 3: Estructura XML
-            prompt_parts.append("\n\nESTRUCTURA XML:")
-            prompt_parts.append(str(xml_structure).strip())
-            
-            # Unir todas las partes
-            final_prompt = "\n".join(prompt_parts)
-            
-            return final_prompt
-        except Exception as e:
-            st.error(f"❌ Error en el formato del prompt: {str(e)}")
-            # Log the error details for debugging
-            st.error(f"Debug info:\nUser input: {user_input}\nPlan content length: {len(str(plan_content))}\nXML structure length: {len(xml_structure)}")
-            return None
-            
+        result = generate_prompt(user_input, template=template)
+    except PromptGenerationError as e:
+        st.error(str(e))
+        return None
     except Exception as e:
         st.error(f"Error al generar el prompt: {str(e)}")
         return None
 
-def generate_debug_plan(error_description):
-    """Generate a debug plan based on error description."""
-    plan_content = {
-        "analysis": {
-            "error_description": error_description,
-            "potential_causes": [],
-            "affected_areas": []
-        },
-        "diagnostic_steps": [],
-        "test_strategy": [],
-        "risk_considerations": []
-    }
-    
-    # Create and save the debug plan file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    plan_filename = f"debug_plan_{timestamp}.md"
-    
-    with open(plan_filename, 'w', encoding='utf-8') as f:
-        f.write(f"""# Plan de Depuración
-## Error Reportado
-{error_description}
-
-## Análisis Inicial
-[Pendiente de aprobación]
-
-## Pasos de Diagnóstico
-[Pendiente de aprobación]
-
-## Estrategia de Pruebas
-[Pendiente de aprobación]
+    results.put(st.session_state.session_id, key, result)
+    if result.reused:
+        st.info("♻️ Plan y prompt reutilizados de una solicitud idéntica anterior")
+    else:
+        st.success("✅ Plan generated and validated successfully!")
+    show_size_report(result.size_report)
+    return key
+
+def show_stored_prompt(tab):
+    """Show the tab's latest prompt from the session cache on every rerun"""
+    key = st.session_state.get(f"{tab}_result_key")
+    if key is None:
+        return
+    result = get_session_results().get(st.session_state.session_id, key)
+    if result is None:
+        st.info("El último prompt generado se liberó de la memoria; vuelve a generarlo.")
+        st.session_state[f"{tab}_result_key"] = None
+        return
+
+    st.markdown("### Prompt Generado:")
+    show_prompt(result.prompt, key=tab)
+    dedup_stats = get_plan_deduplicator().stats()
+    st.caption(f"Deduplicación de planes: {dedup_stats['hit_rate']:.0%} de aciertos "
+               f"({dedup_stats['hits']}/{dedup_stats['hits'] + dedup_stats['misses']})")
+
+    # Add copy button
+    if st.button("📋 Copiar al Portapapeles", key=f"copy_{tab}"):
+        st.write("Prompt copiado al portapapeles!")
+
+def show_similar_incidents(incident_text):
+    """List past incidents like this one; returns the one whose image analysis the user chose to reuse"""
+    if not incident_text.strip():
+        return None
+    key = ("incidents", content_digest(incident_text))
+    results = get_session_results()
+    incidents = results.get(st.session_state.session_id, key)
+    if incidents is None:
+        incidents = find_similar_incidents(incident_text)
+        results.put(st.session_state.session_id, key, incidents)
+    if not incidents:
+        return None
 
-⚠️ Este plan requiere aprobación antes de proceder.""")
-    
-    return plan_filename, plan_content
+    with st.expander(f"🔁 {len(incidents)} incidente(s) similar(es) en el historial", expanded=True):
+        for incident in incidents:
+            st.markdown(f"**{incident.similarity:.0%} de similitud** · "
+                        f"{datetime.fromtimestamp(incident.created_at).strftime('%Y-%m-%d %H:%M')}")
+            st.code(incident.error_text[:INCIDENT_PREVIEW_CHARS], language=None)
+            if incident.image_analysis:
+                st.markdown(f"*Análisis de imágenes:* {incident.image_analysis[:INCIDENT_PREVIEW_CHARS]}")
+            plan_data = get_plan_store().get(incident.plan_id) if incident.plan_id else None
+            prompt = (plan_data or {}).get("prompts", {}).get(DEBUG_TEMPLATE.name)
+            if prompt and st.checkbox("Ver el prompt generado entonces", key=f"incident_prompt_{incident.incident_id}"):
+                show_prompt(prompt, key=f"incident_{incident.incident_id}")
+
+        reusable = {incident.incident_id: incident for incident in incidents if incident.image_analysis}
+        if not reusable:
+            return None
+        choice = st.radio(
+            "♻️ Reutilizar el análisis de imágenes de un incidente similar (sin llamar a Gemini):",
+            [None] + list(reusable),
+            format_func=lambda incident_id: "No, analizar de nuevo" if incident_id is None
+            else f"Incidente #{incident_id} ({reusable[incident_id].similarity:.0%})",
+            key="reuse_incident",
+        )
+    return reusable.get(choice)
+
+def show_trace_panel(trace):
+    """Collapsible waterfall of where the last request spent its time"""
+    if trace is None or not st.session_state.get("show_timings"):
+        return
+    total_ms = max(trace.duration * 1000, 0.001)
+    rows = []
+    for recorded in trace.waterfall():
+        start = int(recorded["offset_ms"] / total_ms * TRACE_BAR_WIDTH)
+        width = max(1, int(recorded["duration_ms"] / total_ms * TRACE_BAR_WIDTH))
+        bar = (" " * start + "█" * width)[:TRACE_BAR_WIDTH]
+        details = ", ".join(f"{name}={value}" for name, value in recorded["attributes"].items())
+        if recorded["error"]:
+            details = f"❌ {recorded['error']} {details}"
+        name = "  " * recorded["depth"] + recorded["name"]
+        rows.append(f"{name:<26} |{bar:<{TRACE_BAR_WIDTH}}| {recorded['duration_ms']:9.1f} ms  {details}")
+    with st.expander(f"⏱️ Tiempos de la solicitud ({total_ms:,.0f} ms)"):
+        st.code("\n".join(rows) or "Sin etapas registradas", language=None)
+
+def show_search_sidebar():
+    """Sidebar search over stored plans, debug plans and image analyses"""
+    st.sidebar.markdown("### 🔎 Buscar en el historial")
+    query = st.sidebar.text_input(
+        "Buscar", key="search_query", label_visibility="collapsed",
+        placeholder="Ejemplo: caída de pagos timeout"
+    )
+    kind = SEARCH_KINDS[st.sidebar.selectbox("Tipo", list(SEARCH_KINDS), key="search_kind")]
+    if not query.strip():
+        return
+
+    started = time.perf_counter()
+    with span("search.query", kind=kind) as search:
+        hits = get_search_index().search(query, kind=kind)
+        search.set(results=len(hits))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    st.sidebar.caption(f"{len(hits)} resultado(s) en {elapsed_ms:.1f} ms")
+    for hit in hits:
+        icon = SEARCH_KIND_ICONS.get(hit.kind, "📄")
+        with st.sidebar.expander(f"{icon} {hit.title or hit.doc_id}"):
+            st.caption(datetime.fromtimestamp(hit.created_at).strftime("%Y-%m-%d %H:%M"))
+            st.markdown(hit.snippet)
+            if st.checkbox("Mostrar documento completo", key=f"search_open_{hit.doc_id}"):
+                document = get_search_index().get(hit.doc_id)
+                if document is not None:
+                    show_prompt(document[2], key=f"search_{hit.doc_id}")
 
 def main():
     st.title("🤖 Generador de Prompts Inteligente")
+    st.sidebar.checkbox(
+        "⏱️ Mostrar tiempos por etapa",
+        key="show_timings",
+        help="Muestra un desglose de dónde se fue el tiempo en la última solicitud."
+    )
+    show_search_sidebar()
     
     # Create tabs
     tab1, tab2 = st.tabs(["💻 Desarrollo", "🐛 Depuración"])
@@ -714,16 +348,17 @@ def main():
         )
         if st.button("Generar Prompt de Desarrollo"):
             if user_input:
-                prompt = generate_prompt(user_input)
-                if prompt:
-                    st.markdown("### Prompt Generado:")
-                    st.code(prompt, language="markdown")
-                    
-                    # Add copy button
-                    if st.button("📋 Copiar al Portapapeles", key="copy_dev"):
-                        st.write("Prompt copiado al portapapeles!")
+                with start_trace("dev_prompt") as trace:
+                    result_key = run_prompt_generation(user_input)
+                st.session_state.dev_trace = trace
+                if result_key:
+                    # Kept across reruns so paging or copying doesn't lose the prompt
+                    st.session_state.dev_result_key = result_key
             else:
                 st.error("Por favor ingresa un requerimiento.")
+
+        show_stored_prompt("dev")
+        show_trace_panel(st.session_state.get("dev_trace"))
     
     with tab2:
         st.header("Generador de Prompts para Depuración")
@@ -763,50 +398,130 @@ def main():
         
         if has_logs:
             error_logs = st.text_area("Pega los logs de error:", height=100)
+            logs_file = st.file_uploader("...o sube el archivo de logs", type=['log', 'txt'], key="logs_file")
         if has_stacktrace:
             stack_trace = st.text_area("Pega el stack trace:", height=100)
+            stack_trace_file = st.file_uploader(
+                "...o sube el stack trace", type=['log', 'txt'], key="stack_trace_file"
+            )
+        image_files = []
         if has_image:
             if st.session_state.gemini_api_key:
-                image_file = st.file_uploader(
-                    "Sube una imagen del error",
+                image_files = st.file_uploader(
+                    "Sube imágenes del error",
                     type=['png', 'jpg', 'jpeg'],
-                    help="La imagen será analizada usando la API de Gemini para extraer información relevante."
+                    accept_multiple_files=True,
+                    help="Las imágenes serán analizadas en paralelo usando la API de Gemini para extraer información relevante."
+                ) or []
+                if image_files:
+                    st.image(image_files, caption=[f.name for f in image_files], width=240)
+                stream_analysis = st.checkbox(
+                    "Mostrar el análisis en tiempo real",
+                    value=True,
+                    help="Muestra la respuesta de Gemini a medida que se genera."
                 )
-                if image_file:
-                    st.image(image_file, caption="Vista previa de la imagen")
+                near_duplicate_distance = None
+                if st.checkbox(
+                    "Reutilizar el análisis de capturas casi idénticas",
+                    value=IMAGE_NEAR_DUPLICATE_MAX_DISTANCE is not None,
+                    help="Evita llamar a Gemini si ya se analizó una captura visualmente igual (recortada, "
+                         "con otro cursor u hora, o recomprimida). ⚠️ Errores distintos en el mismo diálogo "
+                         "pueden parecer idénticos: actívalo solo si tus capturas repiten el mismo error."
+                ):
+                    near_duplicate_distance = st.slider(
+                        "Tolerancia (bits de diferencia en el hash perceptual)",
+                        min_value=0, max_value=NEAR_DUPLICATE_MAX_SLIDER,
+                        value=(IMAGE_NEAR_DUPLICATE_SUGGESTED_DISTANCE if IMAGE_NEAR_DUPLICATE_MAX_DISTANCE is None
+                               else IMAGE_NEAR_DUPLICATE_MAX_DISTANCE),
+                    )
             else:
                 st.warning("⚠️ Necesitas configurar la API de Gemini para subir imágenes.")
         
+        # Surface recurrences of this incident before paying for any analysis
+        stack_trace_text = ""
+        if has_stacktrace and (stack_trace_file or stack_trace):
+            stack_trace_text = cached_log_digest(stack_trace_file or stack_trace, STACK_TRACE_BUDGET_BYTES).text
+        incident_text = "\n".join(part for part in (error_description, stack_trace_text) if part)
+        reused_incident = show_similar_incidents(incident_text)
+
         if st.button("Generar Prompt de Depuración"):
-            if error_description:
-                # Combine all error information
-                error_info_parts = ["Error Description:", error_description]
+            with start_trace("debug_prompt") as trace:
+                if error_description:
+                    # Combine all error information
+                    error_info_parts = ["Error Description:", error_description]
+                    image_analysis = None
                 
-                if has_logs:
-                    error_info_parts.extend(["", "Logs:", error_logs])
-                if has_stacktrace:
-                    error_info_parts.extend(["", "Stack Trace:", stack_trace])
-                if has_image and image_file and st.session_state.gemini_api_key:
-                    image_analysis = analyze_error_image(image_file)
-                    if image_analysis:
-                        error_info_parts.extend([
-                            "",
-                            "Análisis de Imagen del Error:",
-                            image_analysis
-                        ])
+                    # Large logs are streamed and condensed to a byte budget
+                    if has_logs:
+                        logs_digest = cached_log_digest(logs_file or error_logs, LOG_BUDGET_BYTES)
+                        show_log_digest("Logs", logs_digest)
+                        error_info_parts.extend(["", "Logs:", logs_digest.text])
+                    if has_stacktrace:
+                        stack_trace_digest = cached_log_digest(
+                            stack_trace_file or stack_trace, STACK_TRACE_BUDGET_BYTES
+                        )
+                        show_log_digest("Stack trace", stack_trace_digest)
+                        error_info_parts.extend(["", "Stack Trace:", stack_trace_digest.text])
+                    if reused_incident is not None:
+                        image_analysis = reused_incident.image_analysis
+                        st.info(f"♻️ Análisis de imágenes reutilizado del incidente #{reused_incident.incident_id}; "
+                                "no se llamó a Gemini")
+                        error_info_parts.extend(["", "Análisis de Imagen del Error:", image_analysis])
+                    elif has_image and image_files and st.session_state.gemini_api_key:
+                        # The same images in this session are never re-read from disk or re-sent
+                        images_key = ("images", tuple(content_digest(image_file) for image_file in image_files))
+                        session_results = get_session_results()
+                        results = session_results.get(st.session_state.session_id, images_key)
+                        if results is None:
+                            placeholders = [st.empty() for _ in image_files] if stream_analysis else None
+
+                            def show_partial_analysis(index, text):
+                                placeholders[index].markdown(f"**{image_files[index].name}**\n\n{text}")
+                            on_progress = show_partial_analysis if stream_analysis else None
+                            with st.spinner(f"Analizando {len(image_files)} imagen(es)..."):
+                                results = analyze_error_images(
+                                    image_files, st.session_state.gemini_api_key, on_progress=on_progress,
+                                    near_duplicate_distance=near_duplicate_distance,
+                                )
+                            if not any(result["error"] for result in results):
+                                session_results.put(st.session_state.session_id, images_key, results)
+                        show_image_analysis_results(results)
+                        image_analysis = merge_image_analyses(results)
+                        cache_stats = get_analysis_cache().stats()
+                        st.caption(
+                            f"Caché de análisis: {cache_stats['hits']} aciertos / "
+                            f"{cache_stats['misses']} fallos"
+                        )
+                        if image_analysis:
+                            error_info_parts.extend([
+                                "",
+                                "Análisis de Imagen del Error:",
+                                image_analysis
+                            ])
+                        else:
+                            # Degrade to a text-only prompt rather than failing the whole request
+                            st.warning("⚠️ No se pudo analizar ninguna imagen; el prompt se generará solo con el texto.")
+                            error_info_parts.extend([
+                                "",
+                                f"Nota: se adjuntaron {len(image_files)} imagen(es) del error, "
+                                "pero no pudieron analizarse.",
+                            ])
                 
-                full_error_info = "\n".join(error_info_parts)
+                    full_error_info = "\n".join(error_info_parts)
                 
-                prompt = generate_prompt(full_error_info)
-                if prompt:
-                    st.markdown("### Prompt Generado:")
-                    st.code(prompt, language="markdown")
-                    
-                    # Add copy button
-                    if st.button("📋 Copiar al Portapapeles", key="copy_debug"):
-                        st.write("Prompt copiado al portapapeles!")
-            else:
-                st.error("Por favor describe el error a resolver.")
+                    result_key = run_prompt_generation(full_error_info, template=DEBUG_TEMPLATE)
+                    if result_key:
+                        st.session_state.debug_result_key = result_key
+                        result = get_session_results().get(st.session_state.session_id, result_key)
+                        # Remember new incidents only; reused ones are already in the index
+                        if result is not None and not result.reused and reused_incident is None:
+                            record_incident(incident_text, result.plan_id, image_analysis)
+                else:
+                    st.error("Por favor describe el error a resolver.")
+            st.session_state.debug_trace = trace
+
+        show_stored_prompt("debug")
+        show_trace_panel(st.session_state.get("debug_trace"))
 
 if __name__ == "__main__":
     main()
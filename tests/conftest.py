@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def scratch_dir(tmp_path, monkeypatch):
+    """Run in an empty directory, so default store paths (project_plans/, analysis_cache/) stay out of the tree"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,68 @@
+import os
+
+from artifact_log import INDEX_FILE, ArtifactLog
+
+
+def _fill(log, count, size=200):
+    texts = {f"plan_{index}": f"{index:04d} " + "x" * size for index in range(count)}
+    for artifact_id, text in texts.items():
+        log.append(artifact_id, text)
+    return texts
+
+
+def test_rotation_compresses_closed_segments(tmp_path):
+    log = ArtifactLog(str(tmp_path), segment_max_bytes=1000, background=False)
+    texts = _fill(log, 20)
+
+    names = sorted(os.listdir(tmp_path))
+    assert any(name.endswith(".seg.z") for name in names)
+    # Only the active segment stays raw
+    assert len([name for name in names if name.endswith(".seg")]) == 1
+    for artifact_id, text in texts.items():
+        assert log.get(artifact_id) == text
+
+
+def test_reopen_reads_every_artifact(tmp_path):
+    log = ArtifactLog(str(tmp_path), segment_max_bytes=1000, background=False)
+    texts = _fill(log, 20)
+    log.append("plan_3", "replaced")
+    texts["plan_3"] = "replaced"
+
+    reopened = ArtifactLog(str(tmp_path), segment_max_bytes=1000, background=False)
+    for artifact_id, text in texts.items():
+        assert reopened.get(artifact_id) == text
+    reopened.append("after_reopen", "nuevo")
+    assert reopened.get("after_reopen") == "nuevo"
+
+
+def test_reopen_skips_torn_index_line(tmp_path):
+    log = ArtifactLog(str(tmp_path), background=False)
+    log.append("complete", "texto")
+    with open(os.path.join(tmp_path, INDEX_FILE), 'a', encoding='utf-8') as f:
+        f.write("torn\t00000000.seg\t0")
+
+    reopened = ArtifactLog(str(tmp_path), background=False)
+    assert reopened.get("complete") == "texto"
+    assert reopened.get("torn") is None
+
+
+def test_reopen_compresses_segments_left_raw(tmp_path):
+    log = ArtifactLog(str(tmp_path), segment_max_bytes=1000, background=False)
+    # Rotate without compressing, as an interrupted process would
+    log._schedule_compression = lambda number: None
+    texts = _fill(log, 10)
+    assert not any(name.endswith(".z") for name in os.listdir(tmp_path))
+
+    reopened = ArtifactLog(str(tmp_path), segment_max_bytes=1000, background=False)
+    assert any(name.endswith(".seg.z") for name in os.listdir(tmp_path))
+    for artifact_id, text in texts.items():
+        assert reopened.get(artifact_id) == text
+
+
+def test_prunes_oldest_segments(tmp_path):
+    log = ArtifactLog(str(tmp_path), segment_max_bytes=1000, max_segments=2, background=False)
+    _fill(log, 40)
+
+    assert log.get("plan_0") is None
+    assert log.get("plan_39") is not None
+    assert log.stats()["segments"] <= 3
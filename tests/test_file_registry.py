@@ -0,0 +1,32 @@
+from file_registry import FileHandleRegistry, get_file_deleter
+
+
+def _registry(deleted):
+    return FileHandleRegistry(delete_file=deleted.append)
+
+
+def test_same_content_is_uploaded_once():
+    registry = _registry([])
+    uploads = []
+
+    def upload():
+        uploads.append(1)
+        return {"name": f"files/{len(uploads)}"}
+
+    first, reused_first = registry.get_or_upload(b"imagen", "image/png", upload)
+    second, reused_second = registry.get_or_upload(b"imagen", "image/png", upload)
+    assert (reused_first, reused_second) == (False, True)
+    assert first == second
+    assert len(uploads) == 1
+
+
+def test_clear_deletes_every_remote_file():
+    deleted = []
+    registry = _registry(deleted)
+    for index in range(3):
+        registry.get_or_upload(bytes([index]), "image/png", lambda index=index: {"name": f"files/{index}"})
+
+    assert registry.clear() == 3
+    get_file_deleter().flush()
+    assert sorted(deleted) == ["files/0", "files/1", "files/2"]
+    assert registry.stats()["handles"] == 0
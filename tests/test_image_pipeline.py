@@ -0,0 +1,67 @@
+import io
+
+from PIL import Image
+
+from image_pipeline import image_buffer, image_stream, preprocess_image
+
+
+def _encode(image, fmt, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+def test_image_stream_of_bytes_and_full_memoryview():
+    data = b"0123456789"
+    assert image_stream(data).read() == data
+    assert image_stream(memoryview(data)).read() == data
+
+
+def test_image_stream_of_sliced_memoryview_matches_image_buffer():
+    view = memoryview(b"0123456789")[2:5]
+    assert image_stream(view).read() == b"234"
+    assert image_buffer(view).tobytes() == b"234"
+
+
+def test_image_stream_rewinds_uploads():
+    upload = io.BytesIO(b"png bytes")
+    upload.read()
+    assert image_stream(upload).read() == b"png bytes"
+
+
+def test_preprocess_applies_exif_orientation():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90° clockwise when taken
+    photo = _encode(Image.new("RGB", (400, 200), (200, 30, 30)), "JPEG", exif=exif.tobytes())
+
+    prepared = preprocess_image(photo)
+    assert prepared.original_dimensions == (400, 200)
+    assert prepared.dimensions == (200, 400)
+    with Image.open(io.BytesIO(prepared.data)) as result:
+        assert not result.getexif()
+
+
+def test_preprocess_caps_the_longest_side():
+    prepared = preprocess_image(_encode(Image.new("RGB", (4000, 1000), (0, 0, 0)), "PNG"), max_side=1000)
+    assert prepared.dimensions == (1000, 250)
+    assert prepared.mime_type in ("image/png", "image/webp")
+
+
+def test_small_clean_images_are_sent_untouched():
+    screenshot = _encode(Image.new("RGB", (800, 600), (10, 20, 30)), "PNG")
+    prepared = preprocess_image(screenshot)
+    assert prepared.data == screenshot
+    assert prepared.mime_type == "image/png"
+
+
+def test_large_screenshots_are_reencoded_losslessly():
+    from PIL import ImageDraw
+
+    image = Image.new("RGB", (3000, 1500), (30, 30, 30))
+    draw = ImageDraw.Draw(image)
+    for y in range(0, 1500, 18):
+        draw.text((10, y), f"{y:06d} Traceback (most recent call last)", fill=(220, 220, 220))
+    prepared = preprocess_image(_encode(image, "PNG"))
+    assert prepared.mime_type in ("image/png", "image/webp")
+    assert prepared.final_bytes < prepared.original_bytes
+    assert prepared.stats()["preprocess_ms"] > 0
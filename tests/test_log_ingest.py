@@ -0,0 +1,66 @@
+import io
+import random
+
+from log_ingest import ingest_log, iter_lines
+
+
+def _noisy_log(lines=20_000):
+    generator = random.Random(0)
+    words = ["users", "orders", "cart", "search", "login", "profile", "items", "reports"]
+    rows = [f"2024-05-01 10:00:{index % 60:02d} INFO GET /{generator.choice(words)}/{generator.choice(words)} "
+            f"served in {index % 90} ms" for index in range(lines)]
+    rows[10_000:10_000] = [
+        "Traceback (most recent call last):",
+        '  File "app.py", line 42, in handler',
+        "KeyError: 'user_id'",
+    ]
+    return "\n".join(rows) + "\n"
+
+
+def test_small_logs_pass_through_unchanged():
+    text = "línea 1\nerror: algo falló\nlínea 3"
+    digest = ingest_log(text)
+    assert digest.text == text
+    assert digest.omitted_lines == 0
+
+
+def test_large_logs_fit_the_budget_and_keep_errors():
+    log = _noisy_log()
+    digest = ingest_log(log, budget_bytes=8 * 1024)
+
+    assert len(digest.text.encode("utf-8")) < 10 * 1024
+    assert "KeyError: 'user_id'" in digest.text
+    assert 'File "app.py", line 42' in digest.text
+    assert digest.text.startswith(log.split("\n", 1)[0])
+    assert digest.input_lines == log.count("\n")
+    assert digest.error_regions == 1
+    assert digest.omitted_lines > 0
+    assert "líneas omitidas" in digest.text
+
+
+def test_repeated_lines_are_collapsed_with_a_count():
+    log = "inicio\n" + "".join(f"retry {index} failed at 0x{index:x}\n" for index in range(5000)) + "fin\n"
+    digest = ingest_log(log, budget_bytes=4 * 1024)
+    assert "[×5000]" in digest.text
+    assert digest.collapsed_lines == 4999
+
+
+def test_repeated_errors_near_the_end_are_counted_once():
+    log = _noisy_log(lines=5000)
+    log += "".join(f"2024-05-01 11:00:{index:02d} INFO GET /health served in 3 ms\n"
+                   f"ERROR pool exhausted after {index} ms\n" for index in range(10))
+    digest = ingest_log(log, budget_bytes=8 * 1024)
+    assert digest.text.count("ERROR pool exhausted") == 1
+    assert "[×10]" in digest.text
+
+
+def test_binary_uploads_are_streamed_without_closing_them():
+    upload = io.BytesIO("uno\ndos\ntres\n".encode("utf-8"))
+    assert list(iter_lines(upload)) == ["uno\n", "dos\n", "tres\n"]
+    assert not upload.closed
+    assert ingest_log(upload).text == "uno\ndos\ntres"
+
+
+def test_invalid_utf8_is_replaced():
+    digest = ingest_log(b"ok\n\xff\xfe roto\n")
+    assert "roto" in digest.text
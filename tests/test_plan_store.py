@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import time
+
+from plan_store import JsonFilePlanStore, PlanDeduplicator, SQLitePlanStore, write_json_atomic
+
+
+def _plan(index, input_hash="hash", status="validated", padding=0):
+    return {"id": f"{index:06d}", "status": status, "input_hash": input_hash,
+            "created_at": time.time(), "body": "x" * padding}
+
+
+def test_sqlite_store_is_created_with_incremental_auto_vacuum(tmp_path):
+    store = SQLitePlanStore(str(tmp_path / "plans.db"))
+    conn = store._connection()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_sqlite_prune_returns_space_to_the_filesystem(tmp_path):
+    path = str(tmp_path / "plans.db")
+    store = SQLitePlanStore(path, retention_days=None, max_plans=10, maintenance_interval=10**9)
+    for index in range(500):
+        store.save(_plan(index, padding=2000))
+    store._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size_before = os.path.getsize(path)
+
+    assert store.prune() == 490
+    assert os.path.getsize(path) < size_before / 10
+    assert len(store.list_plans(limit=100)[0]) == 10
+
+
+def test_sqlite_compact_converts_databases_without_auto_vacuum(tmp_path):
+    path = str(tmp_path / "plans.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE unrelated (value)")
+    conn.commit()
+    conn.close()
+
+    store = SQLitePlanStore(path)
+    store.compact()
+    assert store._connection().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def test_sqlite_save_prunes_every_maintenance_interval(tmp_path):
+    store = SQLitePlanStore(str(tmp_path / "plans.db"), retention_days=None, max_plans=3, maintenance_interval=5)
+    for index in range(5):
+        store.save(_plan(index))
+    assert [plan["id"] for plan in store.list_plans()[0]] == ["000004", "000003", "000002"]
+
+
+def test_sqlite_find_by_input_hash_returns_newest_with_status(tmp_path):
+    store = SQLitePlanStore(str(tmp_path / "plans.db"))
+    store.save(_plan(1, "a"))
+    store.save(_plan(2, "a"))
+    store.save(_plan(3, "a", status="pending_validation"))
+    assert store.find_by_input_hash("a", status="validated")["id"] == "000002"
+    assert store.find_by_input_hash("a")["id"] == "000003"
+    assert store.find_by_input_hash("b") is None
+
+
+def test_json_store_finds_plans_through_its_index(tmp_path):
+    store = JsonFilePlanStore(str(tmp_path))
+    store.save(_plan(1, "a"))
+    store.save(_plan(2, "b"))
+    store.save(_plan(3, "a", status="pending_validation"))
+
+    assert store.find_by_input_hash("a", status="validated")["id"] == "000001"
+    assert store.find_by_input_hash("a")["id"] == "000003"
+    assert store.find_by_input_hash("c") is None
+    # Lookups must not depend on scanning the plan files
+    os.remove(tmp_path / "plan_000002.json")
+    assert store.find_by_input_hash("b") is None
+
+
+def test_json_store_sees_plans_saved_by_another_instance(tmp_path):
+    reader = JsonFilePlanStore(str(tmp_path))
+    assert reader.find_by_input_hash("a") is None
+    JsonFilePlanStore(str(tmp_path)).save(_plan(1, "a"))
+    assert reader.find_by_input_hash("a")["id"] == "000001"
+
+
+def test_json_store_builds_index_for_existing_plans(tmp_path):
+    write_json_atomic(str(tmp_path / "plan_000001.json"), _plan(1, "a"))
+    store = JsonFilePlanStore(str(tmp_path))
+    assert store.find_by_input_hash("a", status="validated")["id"] == "000001"
+
+
+def test_json_store_prunes_every_maintenance_interval(tmp_path):
+    store = JsonFilePlanStore(str(tmp_path), retention_days=None, max_plans=3, maintenance_interval=4)
+    for index in range(8):
+        store.save(_plan(index, input_hash=f"h{index}"))
+
+    plan_files = sorted(name for name in os.listdir(tmp_path) if name.startswith("plan_"))
+    assert plan_files == ["plan_000005.json", "plan_000006.json", "plan_000007.json"]
+    assert store.find_by_input_hash("h0") is None
+    assert store.find_by_input_hash("h7")["id"] == "000007"
+    with open(tmp_path / "input_index.tsv", encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_deduplicator_serves_remembered_plans_before_they_are_stored(tmp_path):
+    store = SQLitePlanStore(str(tmp_path / "plans.db"))
+    deduplicator = PlanDeduplicator(store)
+    assert deduplicator.lookup("a") is None
+
+    plan = _plan(1, "a")
+    deduplicator.remember(plan)
+    assert deduplicator.lookup("a") is plan
+    assert deduplicator.stats()["hits"] == 1
+    assert deduplicator.stats()["misses"] == 1
+
+
+def test_deduplicator_falls_back_to_validated_plans_in_the_store(tmp_path):
+    store = SQLitePlanStore(str(tmp_path / "plans.db"))
+    store.save(_plan(1, "a", status="pending_validation"))
+    store.save(_plan(2, "b"))
+    deduplicator = PlanDeduplicator(store, max_recent=1)
+
+    assert deduplicator.lookup("a") is None
+    assert deduplicator.lookup("b")["id"] == "000002"
@@ -0,0 +1,40 @@
+import io
+import json
+
+import prompt_cli
+
+
+def _write_rows(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_bad_rows_become_error_records_in_order(scratch_dir):
+    input_path = _write_rows(scratch_dir / "rows.jsonl", [
+        json.dumps({"id": 1, "user_input": "Crear un API REST"}),
+        json.dumps({"id": 2, "user_input": "Otro", "template": "nope"}),
+        "{no es json",
+        json.dumps(["no", "es", "objeto"]),
+        json.dumps({"id": 5, "user_input": "Arreglar un error", "template": "debug"}),
+        json.dumps({"id": 6}),
+    ])
+    output = io.StringIO()
+
+    summary = prompt_cli.run(input_path, output, "development", workers=1, batch_size=2)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["row"] for record in records] == [1, 2, 3, 4, 5, 6]
+    assert [record["id"] for record in records] == [1, 2, None, None, 5, 6]
+    assert [("error" in record) for record in records] == [False, True, True, True, False, True]
+    assert "nope" in records[1]["error"]
+    assert summary["ok"] == 2
+    assert summary["failed"] == 4
+
+
+def test_exit_status_reports_failures(scratch_dir):
+    good = _write_rows(scratch_dir / "good.jsonl", [json.dumps({"user_input": "Crear un API REST"})])
+    bad = _write_rows(scratch_dir / "bad.jsonl", ["{no es json"])
+
+    assert prompt_cli.main([good, "-o", str(scratch_dir / "out.jsonl"), "--workers", "1"]) == 0
+    assert prompt_cli.main([bad, "-o", str(scratch_dir / "out.jsonl"), "--workers", "1"]) == 1
+    assert prompt_cli.main([str(scratch_dir / "missing.jsonl"), "-o", str(scratch_dir / "out.jsonl")]) == 2
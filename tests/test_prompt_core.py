@@ -0,0 +1,116 @@
+import io
+
+import pytest
+
+import prompt_core
+from analysis_cache import AnalysisCache
+from gemini_stub import StubGeminiClient
+
+SINGLETONS = (
+    prompt_core.get_plan_store,
+    prompt_core.get_plan_deduplicator,
+    prompt_core.get_search_index,
+    prompt_core.get_perceptual_index,
+)
+
+
+@pytest.fixture
+def core(scratch_dir, monkeypatch):
+    """prompt_core with fresh process-wide stores under a scratch directory and synchronous writes"""
+    monkeypatch.setattr(prompt_core, "PLAN_BACKGROUND_WRITES", False)
+    monkeypatch.setattr(prompt_core, "SEARCH_INDEX_ENABLED", False)
+    for singleton in SINGLETONS:
+        singleton.cache_clear()
+    yield prompt_core
+    for singleton in SINGLETONS:
+        singleton.cache_clear()
+
+
+def _dialog(message):
+    """Same error dialog layout with a different message, as dHash sees them"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (1920, 1080), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((600, 400, 1320, 680), fill=(255, 255, 255), outline=(0, 0, 0))
+    draw.text((640, 520), message, fill=(0, 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_identical_inputs_reuse_the_stored_prompt(core):
+    first = core.generate_prompt("Crear un API REST")
+    second = core.generate_prompt("  crear un   api rest ")
+    assert not first.reused
+    assert second.reused
+    assert second.plan_id == first.plan_id
+    assert second.prompt == first.prompt
+
+
+def test_budget_changes_render_the_prompt_again(core, monkeypatch):
+    first = core.generate_prompt("Crear un API REST")
+    monkeypatch.setattr(prompt_core, "PROMPT_MAX_TOKENS", prompt_core.PROMPT_MAX_TOKENS - 1000)
+
+    second = core.generate_prompt("Crear un API REST")
+    assert not second.reused
+    assert second.plan_id == first.plan_id
+    assert core.generate_prompt("Crear un API REST").reused
+
+
+def test_stored_prompts_without_digest_are_rendered_again(core):
+    first = core.generate_prompt("Crear un API REST")
+    plan_data = core.get_plan_store().get(first.plan_id)
+    del plan_data["prompt_digests"]
+    core.get_plan_store().save(plan_data)
+    core.get_plan_deduplicator.cache_clear()
+
+    assert not core.generate_prompt("Crear un API REST").reused
+
+
+def test_near_duplicate_reuse_is_opt_in(core, tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    stub = StubGeminiClient(latency_seconds=0)
+    refused, denied = _dialog("connection refused"), _dialog("permission denied")
+
+    core.run_image_analysis(refused, stub, cache, indexer=None)
+    core.run_image_analysis(denied, stub, cache, indexer=None)
+    assert stub.calls == 2
+
+
+def test_near_duplicate_analysis_is_not_cached_under_the_new_image(core, tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    stub = StubGeminiClient(latency_seconds=0)
+    refused, denied = _dialog("connection refused"), _dialog("permission denied")
+
+    core.run_image_analysis(refused, stub, cache, indexer=None, near_duplicate_distance=12)
+    _, _, timings = core.run_image_analysis(denied, stub, cache, indexer=None, near_duplicate_distance=12)
+    assert timings["near_duplicate_distance"] is not None
+    assert stub.calls == 1
+
+    # With reuse switched off the second screenshot gets its own analysis
+    _, _, timings = core.run_image_analysis(denied, stub, cache, indexer=None)
+    assert timings is not None and "near_duplicate_distance" not in timings
+    assert stub.calls == 2
+
+
+def test_analyses_made_with_reuse_off_can_be_reused_later(core, tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    stub = StubGeminiClient(latency_seconds=0)
+
+    core.run_image_analysis(_dialog("connection refused"), stub, cache, indexer=None)
+    _, _, timings = core.run_image_analysis(_dialog("permission denied"), stub, cache, indexer=None,
+                                            near_duplicate_distance=12)
+    assert timings["near_duplicate_distance"] is not None
+    assert stub.calls == 1
+
+
+def test_image_analysis_indexing_follows_the_indexer(core, tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    stub = StubGeminiClient(latency_seconds=0)
+    indexed = []
+
+    core.run_image_analysis(_dialog("uno"), stub, cache, indexer=None)
+    core.run_image_analysis(_dialog("dos"), stub, cache,
+                            indexer=lambda doc_id, kind, body, title=None: indexed.append(kind))
+    assert indexed == ["image_analysis"]
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+
+from analysis_cache import AnalysisCache
+from gemini_stub import StubGeminiClient
+from prompt_service import PromptService
+
+
+def _request(app, method, path, body=b"", headers=()):
+    """Send one HTTP request through the ASGI app and return (status, decoded JSON body)"""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.fixture
+def app(scratch_dir):
+    stub = StubGeminiClient(latency_seconds=0)
+    return PromptService(client_factory=lambda api_key: stub, persist=False, workers=1,
+                         analysis_cache=AnalysisCache(str(scratch_dir / "cache")))
+
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b'"texto"', b"{}", b'{"user_input": 42}', b'{"user_input": "  "}'])
+def test_bad_prompt_requests_are_rejected_with_400(app, body):
+    status, payload = _request(app, "POST", "/v1/prompts/development", body)
+    assert status == 400
+    assert payload["error"]
+
+
+def test_undecodable_images_are_rejected_with_400(app):
+    status, payload = _request(app, "POST", "/v1/images/analyze", b"esto no es una imagen",
+                               headers=[(b"x-gemini-api-key", b"clave")])
+    assert status == 400
+    assert app.counters["errors"] == 0
+
+
+def test_unexpected_errors_do_not_leak_their_message(app):
+    def broken(api_key):
+        raise RuntimeError("/srv/secret/config.json")
+
+    app.client_factory = broken
+    status, payload = _request(app, "POST", "/v1/images/analyze", b"imagen",
+                               headers=[(b"x-gemini-api-key", b"clave")])
+    assert status == 500
+    assert "secret" not in payload["error"]
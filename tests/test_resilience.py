@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from resilience import (
+    CallDeadlineExceeded,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    call_with_retry,
+    run_with_timeout,
+)
+
+
+class Transient(Exception):
+    pass
+
+
+class Permanent(Exception):
+    pass
+
+
+def _policy(**options):
+    options = dict({"max_attempts": 3, "base_delay": 0.001, "max_delay": 0.002, "seed": 1}, **options)
+    return RetryPolicy((Transient,), **options)
+
+
+def _flaky(failures, error=Transient):
+    calls = []
+
+    def attempt(remaining):
+        calls.append(remaining)
+        if len(calls) <= failures:
+            raise error("falla")
+        return "ok"
+    return attempt, calls
+
+
+def test_retries_transient_errors_until_success():
+    attempt, calls = _flaky(2)
+    breaker = CircuitBreaker()
+    assert call_with_retry(attempt, _policy(), breaker) == ("ok", 3)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_gives_up_after_max_attempts():
+    attempt, calls = _flaky(5)
+    with pytest.raises(Transient):
+        call_with_retry(attempt, _policy(), CircuitBreaker())
+    assert len(calls) == 3
+
+
+def test_does_not_retry_permanent_errors_or_count_them_against_the_breaker():
+    attempt, calls = _flaky(1, error=Permanent)
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(Permanent):
+        call_with_retry(attempt, _policy(), breaker)
+    assert len(calls) == 1
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_each_attempt_gets_what_is_left_of_the_deadline():
+    attempt, calls = _flaky(1)
+    call_with_retry(attempt, _policy(), CircuitBreaker(), deadline=10)
+    assert calls[0] <= 10
+    assert calls[1] < calls[0]
+
+
+def test_deadline_stops_retries():
+    def slow(remaining):
+        time.sleep(0.02)
+        raise Transient("lento")
+
+    with pytest.raises((Transient, CallDeadlineExceeded)):
+        call_with_retry(slow, _policy(max_attempts=100, base_delay=0.05, max_delay=0.05),
+                        CircuitBreaker(failure_threshold=1000), deadline=0.1)
+
+
+def test_breaker_opens_after_consecutive_failures_and_short_circuits():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    attempt, calls = _flaky(10)
+    with pytest.raises(Transient):
+        call_with_retry(attempt, _policy(max_attempts=2), breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError) as raised:
+        call_with_retry(attempt, _policy(), breaker)
+    assert len(calls) == 2
+    assert 0 < raised.value.retry_after <= 60
+    assert breaker.stats()["short_circuited"] == 1
+
+
+def test_breaker_lets_one_trial_through_after_cooling_down():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.01)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.02)
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=0.01)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_run_with_timeout_stops_waiting():
+    with pytest.raises(CallDeadlineExceeded):
+        run_with_timeout(time.sleep, 0.01, 0.5)
+    assert run_with_timeout(lambda value: value * 2, 1, 21) == 42
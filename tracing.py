@@ -0,0 +1,218 @@
+"""Lightweight request tracing: context-manager spans, JSON logs and Prometheus counters."""
+import bisect
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+import uuid
+
+try:
+    from pythonjsonlogger.json import JsonFormatter
+except ImportError:
+    try:
+        from pythonjsonlogger.jsonlogger import JsonFormatter
+    except ImportError:
+        JsonFormatter = None
+
+logger = logging.getLogger("prompt_generator.trace")
+
+# Histogram bucket upper bounds, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed stage; attributes such as bytes and cache_hit can be added while it runs"""
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """All spans recorded while handling one request"""
+
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def waterfall(self):
+        """Return finished spans in start order with offsets relative to the trace start"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda recorded: recorded.start)
+        return [
+            {
+                "name": recorded.name,
+                "depth": recorded.depth,
+                "offset_ms": (recorded.start - self.start) * 1000,
+                "duration_ms": recorded.duration * 1000,
+                "thread": recorded.thread,
+                "attributes": dict(recorded.attributes),
+                "error": recorded.error,
+            }
+            for recorded in spans
+        ]
+
+
+class StageMetrics:
+    """Process-wide per-stage counters and duration histograms"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span):
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = {
+                    "count": 0, "errors": 0, "seconds": 0.0, "bytes": 0,
+                    "cache_hits": 0, "cache_misses": 0, "retries": 0, "buckets": [0] * len(self.buckets),
+                }
+            stage["count"] += 1
+            stage["seconds"] += span.duration
+            if span.error is not None:
+                stage["errors"] += 1
+            stage["bytes"] += span.attributes.get("bytes") or 0
+            stage["retries"] += span.attributes.get("retries") or 0
+            cache_hit = span.attributes.get("cache_hit")
+            if cache_hit is True:
+                stage["cache_hits"] += 1
+            elif cache_hit is False:
+                stage["cache_misses"] += 1
+            index = bisect.bisect_left(self.buckets, span.duration)
+            if index < len(self.buckets):
+                stage["buckets"][index] += 1
+
+    def snapshot(self):
+        """Return a copy of the per-stage counters"""
+        with self._lock:
+            return {name: dict(stage, buckets=list(stage["buckets"])) for name, stage in self._stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def to_prometheus(self, prefix="prompt_generator"):
+        """Render the counters in the Prometheus text exposition format"""
+        stages = sorted(self.snapshot().items())
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Time spent per stage.",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        for name, stage in stages:
+            label = _label(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets, stage["buckets"]):
+                cumulative += count
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{label}",le="+Inf"}} {stage["count"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{label}"}} {stage["seconds"]:.6f}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{label}"}} {stage["count"]}')
+        for metric, key, help_text in (
+            ("stage_errors_total", "errors", "Stages that raised."),
+            ("stage_bytes_total", "bytes", "Bytes processed per stage."),
+            ("stage_cache_hits_total", "cache_hits", "Cache hits per stage."),
+            ("stage_cache_misses_total", "cache_misses", "Cache misses per stage."),
+            ("stage_retries_total", "retries", "Retried attempts per stage."),
+        ):
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for name, stage in stages:
+                lines.append(f'{prefix}_{metric}{{stage="{_label(name)}"}} {stage[key]}')
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = StageMetrics()
+
+
+@contextlib.contextmanager
+def start_trace(name):
+    """Collect the spans of one request; yields the Trace"""
+    trace = Trace(name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        trace.duration = time.perf_counter() - trace.start
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        logger.info("trace", extra={
+            "trace_id": trace.trace_id,
+            "trace": trace.name,
+            "duration_ms": round(trace.duration * 1000, 3),
+            "spans": len(trace.spans),
+        })
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time a stage; recorded in the current trace (if any), the metrics and the JSON log"""
+    trace = _current_trace.get()
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+        metrics.observe(current)
+        if trace is not None:
+            trace.add(current)
+        logger.info("span", extra={
+            "trace_id": trace.trace_id if trace is not None else None,
+            "span": name,
+            "duration_ms": round(current.duration * 1000, 3),
+            "error": current.error,
+            **current.attributes,
+        })
+
+
+def traced(func):
+    """Bind func to the calling context's trace, for running it on a worker thread"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def configure_json_logging(level=logging.INFO, stream=None):
+    """Send trace records to stream (stderr by default) as one JSON object per line"""
+    if any(getattr(handler, "_trace_handler", False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler(stream)
+    handler._trace_handler = True
+    if JsonFormatter is not None:
+        handler.setFormatter(JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    else:
+        logger.warning("python-json-logger is not installed; trace logs fall back to plain text")
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False